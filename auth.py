@@ -0,0 +1,172 @@
+import base64
+import hashlib
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Optional, Tuple
+
+# Contraseñas con KDF lento y salt por usuario: "scrypt$n$r$p$salt$hash" o, donde OpenSSL
+# no trae scrypt, "pbkdf2_sha256$iteraciones$salt$hash" (salt y hash en base64)
+SCRYPT_N, SCRYPT_R, SCRYPT_P = 2 ** 14, 8, 1
+PBKDF2_ITERATIONS = 600000
+SALT_BYTES = 16
+HASH_BYTES = 32
+DEFAULT_SCHEME = "scrypt" if hasattr(hashlib, "scrypt") else "pbkdf2_sha256"
+
+VERIFIED_TTL = 300.0          # credenciales ya verificadas que no vuelven a pasar por el KDF (s)
+VERIFIED_MAX = 4096
+TOKEN_TTL = 8 * 3600.0        # vencimiento de los tokens de sesión (s)
+TOKEN_CACHE_TTL = 60.0        # un token verificado se vuelve a buscar en el store pasado este tiempo
+
+def _b64(data: bytes) -> str:
+    return base64.b64encode(data).decode("ascii")
+
+def _params(scheme: str) -> Tuple[int, ...]:
+    return (SCRYPT_N, SCRYPT_R, SCRYPT_P) if scheme == "scrypt" else (PBKDF2_ITERATIONS,)
+
+def _derive(password: str, scheme: str, params: Tuple[int, ...], salt: bytes) -> bytes:
+    secret = password.encode("utf-8")
+    if scheme == "scrypt":
+        n, r, p = params
+        return hashlib.scrypt(secret, salt=salt, n=n, r=r, p=p, maxmem=2 * 128 * r * n, dklen=HASH_BYTES)
+    if scheme == "pbkdf2_sha256":
+        return hashlib.pbkdf2_hmac("sha256", secret, salt, params[0], dklen=HASH_BYTES)
+    raise ValueError(f"Esquema de contraseña desconocido: {scheme}")
+
+def hash_password(password: str, scheme: str = DEFAULT_SCHEME) -> str:
+    salt = secrets.token_bytes(SALT_BYTES)
+    params = _params(scheme)
+    digest = _derive(password, scheme, params, salt)
+    return "$".join([scheme, *map(str, params), _b64(salt), _b64(digest)])
+
+def _parse(stored: str) -> Tuple[str, Tuple[int, ...], bytes, bytes]:
+    scheme, *fields = stored.split("$")
+    *params, salt, digest = fields
+    return scheme, tuple(int(param) for param in params), base64.b64decode(salt), base64.b64decode(digest)
+
+def verify_password(password: str, stored: str) -> bool:
+    try:
+        scheme, params, salt, digest = _parse(stored)
+        return hmac.compare_digest(_derive(password, scheme, params, salt), digest)
+    except (ValueError, TypeError):
+        return False
+
+def needs_rehash(stored: str) -> bool:
+    # Hashes con otro esquema o parámetros más débiles que los actuales
+    try:
+        scheme, params, _, _ = _parse(stored)
+    except (ValueError, TypeError):
+        return True
+    return scheme != DEFAULT_SCHEME or params != _params(DEFAULT_SCHEME)
+
+_dummy_hash: Optional[str] = None
+
+def verify_unknown_user(password: str) -> bool:
+    # Un usuario inexistente cuesta lo mismo que una contraseña incorrecta
+    global _dummy_hash
+    if _dummy_hash is None:
+        _dummy_hash = hash_password(secrets.token_hex(8))
+    verify_password(password, _dummy_hash)
+    return False
+
+class VerifiedCache:
+    """Credenciales que ya pasaron por el KDF en este proceso, por ``VERIFIED_TTL`` segundos.
+
+    La clave es un HMAC con una clave aleatoria del proceso sobre usuario, contraseña y hash
+    guardado: no queda la contraseña en memoria y cambiar el hash invalida la entrada.
+    """
+
+    def __init__(self, ttl: float = VERIFIED_TTL, max_entries: int = VERIFIED_MAX):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._key = secrets.token_bytes(32)
+        self._entries: "OrderedDict[bytes, float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _digest(self, username: str, password: str, stored: str) -> bytes:
+        message = "\0".join((username, password, stored)).encode("utf-8")
+        return hmac.new(self._key, message, hashlib.sha256).digest()
+
+    def check(self, username: str, password: str, stored: str) -> bool:
+        key = self._digest(username, password, stored)
+        with self._lock:
+            expiry = self._entries.get(key)
+            if expiry is None:
+                return False
+            if expiry < time.monotonic():
+                del self._entries[key]
+                return False
+            self._entries.move_to_end(key)
+            return True
+
+    def add(self, username: str, password: str, stored: str):
+        key = self._digest(username, password, stored)
+        with self._lock:
+            self._entries[key] = time.monotonic() + self.ttl
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+# Compartida por todos los controladores del proceso (sesiones en hilos, GUI tras logout)
+verified_cache = VerifiedCache()
+
+def token_digest(token: str) -> str:
+    # Los tokens son aleatorios de 256 bits: alcanza con un hash rápido
+    return hashlib.sha256(token.encode("ascii", "replace")).hexdigest()
+
+class SessionStore:
+    """Tokens de sesión: el store guarda solo el SHA-256 de cada token con su usuario y
+    vencimiento; los tokens ya verificados quedan en memoria ``TOKEN_CACHE_TTL`` segundos.
+
+    ``load``/``save`` leen y escriben el dict ``{digest: {"usuario", "expira"}}`` (en el
+    controlador, ``filesystem/sessions.json``).
+    """
+
+    def __init__(self, load: Callable[[], Dict], save: Callable[[Dict], None], ttl: float = TOKEN_TTL):
+        self._load = load
+        self._save = save
+        self.ttl = ttl
+        self._verified: Dict[str, Tuple[str, float, float]] = {}   # digest -> (usuario, vence, revisar)
+        self._lock = threading.Lock()
+
+    def _update(self, change: Callable[[Dict], None]):
+        # Se relee justo antes de escribir para no pisar los tokens de otros procesos
+        now = time.time()
+        sessions = {digest: session for digest, session in self._load().items() if session["expira"] > now}
+        change(sessions)
+        self._save(sessions)
+
+    def issue(self, username: str) -> str:
+        token = secrets.token_urlsafe(32)
+        digest = token_digest(token)
+        expiry = time.time() + self.ttl
+        with self._lock:
+            self._update(lambda sessions: sessions.__setitem__(digest, {"usuario": username, "expira": expiry}))
+            self._verified[digest] = (username, expiry, time.monotonic() + TOKEN_CACHE_TTL)
+        return token
+
+    def resolve(self, token: str) -> Optional[str]:
+        digest = token_digest(token)
+        now = time.time()
+        with self._lock:
+            cached = self._verified.get(digest)
+            if cached is not None and cached[1] > now and cached[2] > time.monotonic():
+                return cached[0]
+            self._verified.pop(digest, None)
+            session = self._load().get(digest)
+            if session is None or session["expira"] <= now:
+                return None
+            self._verified[digest] = (session["usuario"], session["expira"], time.monotonic() + TOKEN_CACHE_TTL)
+            return session["usuario"]
+
+    def revoke(self, token: str):
+        digest = token_digest(token)
+        with self._lock:
+            self._verified.pop(digest, None)
+            self._update(lambda sessions: sessions.pop(digest, None))
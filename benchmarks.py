@@ -0,0 +1,400 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# main_logic usa rutas relativas ("filesystem/"), así que cada benchmark corre
+# dentro de un directorio temporal para no tocar el volumen real.
+BENCH_DIR = tempfile.mkdtemp(prefix="fat_bench_")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(BENCH_DIR)
+
+import main_logic
+from main_logic import FileSystemController, get_block_path, write_block
+
+def _make_admin_controller() -> FileSystemController:
+    controller = FileSystemController()
+    if not controller.get_admin_status():
+        controller.register_admin("admin", "admin")
+    controller.authenticate("admin", "admin")
+    return controller
+
+def _random_text(size: int) -> str:
+    return "".join(random.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(size))
+
+def _write_scattered_chain(name: str, content: str) -> str:
+    # Simula una cadena fragmentada: los bloques quedan con índices desordenados
+    data = content.encode(main_logic.TEXT_ENCODING)
+    chunks = [data[i:i + main_logic.BLOCK_SIZE] for i in range(0, len(data), main_logic.BLOCK_SIZE)]
+    indices = random.sample(range(len(chunks) * 4), len(chunks))
+    paths = [get_block_path(f"{name}_{index}") for index in indices]
+    for i, chunk in enumerate(chunks):
+        is_eof = (i == len(chunks) - 1)
+        write_block(paths[i], chunk, None if is_eof else paths[i + 1], is_eof)
+    return paths[0]
+
+def _sequential_read_throughput(controller: FileSystemController, names) -> float:
+    start = time.perf_counter()
+    total = 0
+    for name in names:
+        total += len(controller.open_file(name)["content"])
+    elapsed = time.perf_counter() - start
+    return total / elapsed if elapsed else 0.0
+
+def bench_defrag(num_files: int, file_size: int):
+    from defrag import OnlineDefragmenter, fragmentation_report
+
+    controller = _make_admin_controller()
+    names = []
+    for i in range(num_files):
+        name = f"frag{i}"
+        content = _random_text(file_size)
+        controller.create_file(name, content)
+        main_logic.delete_blocks(controller.fat["files"][name]["ruta_datos_inicial"])
+        controller.fat["files"][name]["ruta_datos_inicial"] = _write_scattered_chain(name, content)
+        names.append(name)
+    controller.save_all()
+
+    report = fragmentation_report(controller.fat)
+    before = _sequential_read_throughput(controller, names)
+    print(f"Antes:   fragmentos={report['fragmentos_totales']} run_medio={report['longitud_media_run']:.2f} "
+          f"lectura={before:,.0f} chars/s")
+
+    defragmenter = OnlineDefragmenter(controller, pause=0)
+    start = time.perf_counter()
+    defragmenter.run()
+    elapsed = time.perf_counter() - start
+
+    report = fragmentation_report(controller.fat)
+    after = _sequential_read_throughput(controller, names)
+    print(f"Después: fragmentos={report['fragmentos_totales']} run_medio={report['longitud_media_run']:.2f} "
+          f"lectura={after:,.0f} chars/s")
+    print(f"Desfragmentación: {defragmenter.moved_blocks} bloques en {elapsed:.2f}s")
+
+def _synthetic_fat(num_files: int) -> dict:
+    now = "2025-10-01T12:00:00.123456"
+    owners = [f"user{i}" for i in range(50)]
+    files = {}
+    for i in range(num_files):
+        name = f"archivo_{i}.txt"
+        files[name] = {
+            "nombre": name,
+            "ruta_datos_inicial": get_block_path(f"{name}_0"),
+            "papelera": i % 10 == 0,
+            "total_caracteres": 100 + i % 900,
+            "fecha_creacion": now,
+            "fecha_modificacion": now,
+            "fecha_eliminacion": now if i % 10 == 0 else None,
+            "owner": owners[i % len(owners)],
+            "permissions": {owners[(i + 1) % len(owners)]: ["lectura"]} if i % 3 == 0 else {},
+        }
+    return {"files": files}
+
+def bench_fat_format(num_files: int, file_size: int):
+    from fat_binary import json_to_binary
+
+    main_logic.save_fat(_synthetic_fat(num_files))
+    json_to_binary(main_logic.FAT_FILE, main_logic.FAT_BIN_FILE)
+    probe = f"archivo_{num_files // 2}.txt"
+
+    # JSON: load_fat() parsea todo al arrancar
+    os.rename(main_logic.FAT_BIN_FILE, main_logic.FAT_BIN_FILE + ".aparte")
+    start = time.perf_counter()
+    fat = main_logic.load_fat()
+    json_start = time.perf_counter() - start
+    start = time.perf_counter()
+    fat["files"][probe]
+    json_lookup = time.perf_counter() - start
+    del fat
+    # Igual que get_list_files(): recarga la FAT y filtra
+    start = time.perf_counter()
+    listed = [name for name, entry in main_logic.load_fat()["files"].items() if not entry["papelera"]]
+    json_list = time.perf_counter() - start
+
+    os.rename(main_logic.FAT_BIN_FILE + ".aparte", main_logic.FAT_BIN_FILE)
+    start = time.perf_counter()
+    fat = main_logic.load_fat()
+    bin_start = time.perf_counter() - start
+    start = time.perf_counter()
+    fat["files"][probe]
+    bin_lookup = time.perf_counter() - start
+    start = time.perf_counter()
+    listed_bin = [name for name, entry in main_logic.load_fat()["files"].items() if not entry["papelera"]]
+    bin_list = time.perf_counter() - start
+    assert listed == listed_bin
+
+    print(f"Entradas: {num_files:,}  JSON: {os.path.getsize(main_logic.FAT_FILE):,} B  "
+          f"binario: {os.path.getsize(main_logic.FAT_BIN_FILE):,} B")
+    print(f"{'':10} {'arranque':>12} {'búsqueda':>12} {'listado*':>12}")
+    print(f"{'JSON':10} {json_start * 1000:>10.1f}ms {json_lookup * 1e6:>10.1f}us {json_list * 1000:>10.1f}ms")
+    print(f"{'binario':10} {bin_start * 1000:>10.1f}ms {bin_lookup * 1e6:>10.1f}us {bin_list * 1000:>10.1f}ms")
+    print("* listado = recargar la FAT y filtrar la papelera, como get_list_files()")
+
+def bench_cli_start(num_files: int, file_size: int):
+    import subprocess
+    from fat_binary import write_binary_fat
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    # Con el write-back el admin recién creado solo llega a users.json al cerrar la sesión.
+    # El arranque se mide con --token: con --password domina el KDF de la contraseña
+    controller = _make_admin_controller()
+    token = controller.issue_token()
+    controller.shutdown()
+    fat = _synthetic_fat(num_files)
+    env = dict(os.environ, PYTHONPATH=repo_dir)
+    token_command = [sys.executable, "-m", "fat_cli", "--token", token, "ls"]
+    password_command = [sys.executable, "-m", "fat_cli", "--user", "admin", "--password", "admin", "ls"]
+
+    def cold_start(command) -> float:
+        times = []
+        for _ in range(5):
+            start = time.perf_counter()
+            subprocess.run(command, env=env, stdout=subprocess.DEVNULL, check=True)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    main_logic.save_fat(fat)
+    json_time = cold_start(token_command)
+    write_binary_fat(main_logic.FAT_BIN_FILE, fat["files"])
+    bin_time = cold_start(token_command)
+    password_time = cold_start(password_command)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], check=True)
+    python_time = time.perf_counter() - start
+
+    print(f"Entradas: {num_files:,}  (intérprete vacío: {python_time * 1000:.1f}ms)")
+    print(f"fat_cli ls, FAT JSON:    {json_time * 1000:.1f}ms")
+    print(f"fat_cli ls, FAT binaria: {bin_time * 1000:.1f}ms")
+    print(f"con --password (binaria): {password_time * 1000:.1f}ms")
+
+def _drop_block_cache():
+    # Caché fría sin privilegios: se sincroniza y se le pide al kernel que olvide cada bloque
+    if not hasattr(os, "posix_fadvise"):
+        return False
+    os.sync()
+    for dir_entry in os.scandir(main_logic.FS_DIR):
+        if dir_entry.name.startswith(main_logic.BLOCK_PREFIX):
+            fd = os.open(dir_entry.path, os.O_RDONLY)
+            try:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            finally:
+                os.close(fd)
+    return True
+
+def bench_readahead(num_files: int, file_size: int):
+    from readahead import ReadAhead
+
+    controller = _make_admin_controller()
+    names = [f"seq{i}" for i in range(num_files)]
+    for name in names:
+        controller.create_file(name, _random_text(file_size))
+    controller.shutdown()
+
+    engine = ReadAhead()
+    results = {}
+    for label, readahead in (("sin read-ahead", None), ("con read-ahead", engine)):
+        controller.readahead = readahead
+        cold = _drop_block_cache()
+        cold_throughput = _sequential_read_throughput(controller, names)
+        results[label] = (cold_throughput, _sequential_read_throughput(controller, names))
+    engine.shutdown()
+    print(f"Archivos: {num_files}  bloques por archivo: {-(-file_size // main_logic.BLOCK_SIZE)}  "
+          f"{'caché fría vía posix_fadvise' if cold else 'posix_fadvise no disponible: la caché no se vacía'}")
+    print(f"{'':16} {'fría':>16} {'caliente':>16}")
+    for label, (cold_throughput, warm_throughput) in results.items():
+        print(f"{label:16} {cold_throughput:>8,.0f} chars/s {warm_throughput:>8,.0f} chars/s")
+    stats = engine.stats
+    print(f"Read-ahead: {stats['aciertos']} aciertos, {stats['fallos']} fallos, {stats['anticipados']} bloques anticipados")
+
+def bench_fat_shards(num_files: int, file_size: int):
+    import json
+    import shutil
+    from fat_binary import write_binary_fat
+    from fat_shards import format_shards
+
+    fat = _synthetic_fat(num_files)
+    probe = f"archivo_{num_files // 2}.txt"
+    entry_size = len(json.dumps(fat["files"][probe], indent=4))
+
+    def update_once(controller: FileSystemController) -> float:
+        # Un cambio de una sola entrada por el camino normal: marcar y flush
+        controller.fat["files"][probe]["fecha_modificacion"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+        controller.mark_dirty(files=[probe])
+        start = time.perf_counter()
+        controller.flush()
+        return time.perf_counter() - start
+
+    results = []
+    main_logic.save_fat(fat)
+    controller = _make_admin_controller()
+    elapsed = update_once(controller)
+    results.append(("JSON", os.path.getsize(main_logic.FAT_FILE), elapsed))
+    controller.shutdown()
+
+    write_binary_fat(main_logic.FAT_BIN_FILE, fat["files"])
+    controller = _make_admin_controller()
+    elapsed = update_once(controller)
+    results.append(("binaria", os.path.getsize(main_logic.FAT_BIN_FILE), elapsed))
+    controller.shutdown()
+    os.remove(main_logic.FAT_BIN_FILE)
+
+    for shards in (16, 64, 256):
+        format_shards(main_logic.FAT_SHARDS_DIR, fat["files"].items(), shards)
+        controller = _make_admin_controller()
+        elapsed = update_once(controller)
+        results.append((f"{shards} shards", controller.fat["files"].bytes_written, elapsed))
+        controller.shutdown()
+        shutil.rmtree(main_logic.FAT_SHARDS_DIR)
+
+    print(f"Entradas: {num_files:,}  entrada modificada: {entry_size} B")
+    print(f"{'':12} {'bytes escritos':>16} {'amplificación':>14} {'flush':>10}")
+    for label, written, elapsed in results:
+        print(f"{label:12} {written:>14,} B {written / entry_size:>13,.0f}x {elapsed * 1000:>8.1f}ms")
+
+def bench_fat_memory(num_files: int, file_size: int):
+    import gc
+    import json
+    import tracemalloc
+    from fat_compact import load_compact_fat
+
+    main_logic.save_fat(_synthetic_fat(num_files))
+    probe = f"archivo_{num_files // 2}.txt"
+    results = {}
+    for label, load in (("dicts", json.load), ("compacta", load_compact_fat)):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        with open(main_logic.FAT_FILE, 'r') as f:
+            fat = load(f)
+        load_time = time.perf_counter() - start
+        resident = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        listed = [{"name": name, **entry} for name, entry in fat["files"].items() if not entry["papelera"]]
+        list_time = time.perf_counter() - start
+        results[label] = (resident, load_time, list_time, dict(fat["files"][probe]))
+        del fat, listed
+    assert results["dicts"][3] == results["compacta"][3]
+
+    print(f"Entradas: {num_files:,}")
+    print(f"{'':10} {'bytes/entrada':>14} {'carga':>10} {'listado*':>10}")
+    for label, (resident, load_time, list_time, _) in results.items():
+        print(f"{label:10} {resident / num_files:>14,.0f} {load_time * 1000:>8.0f}ms {list_time * 1000:>8.0f}ms")
+    print("* listado = armar los dicts de get_list_files() para las entradas fuera de la papelera")
+
+def bench_versions(num_files: int, file_size: int):
+    controller = _make_admin_controller()
+    versions = 5
+    names = [f"ver{i}" for i in range(num_files)]
+    for name in names:
+        content = _random_text(file_size)
+        controller.create_file(name, content)
+        controller.set_version_retention(name, versions)
+        for _ in range(versions):
+            # Cada versión cambia un solo tramo del contenido
+            offset = random.randrange(len(content))
+            content = content[:offset] + "#" + content[offset + 1:]
+            controller.modify_file(name, content)
+
+    def timed(read) -> float:
+        times = []
+        for _ in range(3):
+            start = time.perf_counter()
+            for name in names:
+                read(name)
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    current = timed(lambda name: controller.open_file(name)["content"])
+    oldest = timed(lambda name: controller.read_version(name, 1)["content"])
+    block_files = sum(1 for dir_entry in os.scandir(main_logic.FS_DIR)
+                      if dir_entry.name.startswith((main_logic.BLOCK_PREFIX, main_logic.VERSION_BLOCK_PREFIX)))
+    stored = controller.get_usage()["volumen"]["bloques"]
+    full_copies = num_files * (versions + 1) * -(-file_size // main_logic.BLOCK_SIZE)
+    controller.shutdown()
+    print(f"Archivos: {num_files}  versiones por archivo: {versions}  bloques por versión: {-(-file_size // main_logic.BLOCK_SIZE)}")
+    print(f"Lectura versión actual:      {current * 1000:.1f}ms")
+    print(f"Lectura versión más vieja:   {oldest * 1000:.1f}ms")
+    print(f"Bloques guardados: {stored:,} (con copias completas: {full_copies:,}; nombres de bloque en disco: {block_files:,})")
+
+def bench_replication(num_files: int, file_size: int):
+    from replication import start_mirror
+
+    def write_round(controller: FileSystemController, prefix: str) -> float:
+        start = time.perf_counter()
+        for i in range(num_files):
+            controller.create_file(f"{prefix}{i}", _random_text(file_size))
+        controller.flush()
+        return time.perf_counter() - start
+
+    controller = _make_admin_controller()
+    plain = write_round(controller, "sin")
+    replicator = start_mirror(os.path.join(BENCH_DIR, "espejo"))
+    replicator.wait()
+    mirrored = write_round(controller, "con")
+    start = time.perf_counter()
+    replicator.wait()
+    drain = time.perf_counter() - start
+    controller.shutdown()
+    replicator.stop()
+    stats = replicator.stats()
+    print(f"Archivos: {num_files}  tamaño: {file_size}")
+    print(f"Escritura sin espejo:   {plain * 1000:.1f}ms")
+    print(f"Escritura con espejo:   {mirrored * 1000:.1f}ms (espera por back-pressure: {stats['espera_backpressure_s'] * 1000:.1f}ms)")
+    print(f"Vaciado de la cola:     {drain * 1000:.1f}ms  lag máximo: {stats['lag_max_s'] * 1000:.1f}ms")
+    print(f"Cambios: {stats['encolados']:,} encolados, {stats['aplicados']:,} aplicados en {stats['lotes']} lotes "
+          f"({stats['bytes_copiados']:,} bytes copiados)")
+
+def bench_logins(num_users: int, file_size: int):
+    from concurrent.futures import ThreadPoolExecutor
+    from auth import verified_cache
+
+    admin = _make_admin_controller()
+    users = [f"usuario{i}" for i in range(num_users)]
+    for user in users:
+        admin.add_user(user, f"clave-{user}", "user")
+    admin.shutdown()
+    workers = 8
+
+    def rate(login) -> float:
+        # Logins por segundo con varias sesiones concurrentes, cada una con su controlador
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            assert all(pool.map(login, users))
+        return len(users) / (time.perf_counter() - start)
+
+    verified_cache.clear()
+    cold = rate(lambda user: FileSystemController().authenticate(user, f"clave-{user}"))
+    cached = rate(lambda user: FileSystemController().authenticate(user, f"clave-{user}"))
+    tokens = {user: FileSystemController().login_token(user, f"clave-{user}") for user in users}
+    with_token = rate(lambda user: FileSystemController().authenticate_token(tokens[user]))
+    print(f"Usuarios: {num_users}  sesiones concurrentes: {workers}")
+    print(f"Login con hash (primera vez):      {cold:,.0f} logins/s")
+    print(f"Login con caché de verificación:  {cached:,.0f} logins/s")
+    print(f"Login con token de sesión:        {with_token:,.0f} logins/s")
+
+BENCHMARKS = {
+    "defrag": bench_defrag,
+    "fat-format": bench_fat_format,
+    "cli-start": bench_cli_start,
+    "readahead": bench_readahead,
+    "fat-shards": bench_fat_shards,
+    "fat-memory": bench_fat_memory,
+    "versions": bench_versions,
+    "replication": bench_replication,
+    "logins": bench_logins,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del simulador FAT")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"Volumen temporal: {BENCH_DIR}")
+    BENCHMARKS[args.benchmark](args.files, args.size)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from main_logic import (FS_DIR, BLOCK_EXT, BLOCK_PREFIX, LEGACY_BLOCK_EXT, block_base, get_block_path,
+                        read_block, remove_block, write_block)
+
+# block_<nombre>_<indice>.blk (o .json en volúmenes anteriores) -> (nombre, indice). El nombre puede contener "_"
+BLOCK_NAME_RE = re.compile(
+    rf"^{re.escape(BLOCK_PREFIX)}(.*)_(\d+)(?:{re.escape(BLOCK_EXT)}|{re.escape(LEGACY_BLOCK_EXT)})$")
+
+def parse_block_path(block_path: str) -> Optional[Tuple[str, int]]:
+    match = BLOCK_NAME_RE.match(os.path.basename(block_path))
+    if not match:
+        return None
+    return match.group(1), int(match.group(2))
+
+def chain_paths(first_block_path: Optional[str]) -> List[str]:
+    # Recorre solo los enlaces "siguiente"; se detiene ante bloques faltantes o ciclos
+    paths = []
+    seen = set()
+    current = first_block_path
+    while current and current not in seen and os.path.exists(current):
+        seen.add(current)
+        paths.append(current)
+        try:
+            block = read_block(current)
+        except Exception:
+            break
+        if block.get("eof"):
+            break
+        current = block.get("siguiente")
+    return paths
+
+def is_physical_successor(prev_path: str, next_path: str) -> bool:
+    prev_id = parse_block_path(prev_path)
+    next_id = parse_block_path(next_path)
+    if not prev_id or not next_id:
+        return False
+    return prev_id[0] == next_id[0] and next_id[1] == prev_id[1] + 1
+
+def count_runs(paths: List[str]) -> List[int]:
+    # Un "run" es una secuencia de bloques con índices consecutivos del mismo archivo
+    runs = []
+    for i, path in enumerate(paths):
+        if i > 0 and is_physical_successor(paths[i - 1], path):
+            runs[-1] += 1
+        else:
+            runs.append(1)
+    return runs
+
+def fragmentation_report(fat: Dict) -> Dict:
+    files = {}
+    referenced = set()
+    total_runs = 0
+    total_blocks = 0
+
+    for name, entry in fat["files"].items():
+        paths = chain_paths(entry.get("ruta_datos_inicial"))
+        referenced.update(os.path.normpath(p) for p in paths)
+        runs = count_runs(paths)
+        total_runs += len(runs)
+        total_blocks += len(paths)
+        files[name] = {
+            "bloques": len(paths),
+            "fragmentos": len(runs),
+            "longitud_media_run": (len(paths) / len(runs)) if runs else 0.0,
+        }
+
+    # Espacio libre: bloques en disco que ninguna cadena referencia, agrupados en huecos
+    free_indices: Dict[str, List[int]] = {}
+    for entry_name in os.listdir(FS_DIR):
+        parsed = parse_block_path(entry_name)
+        if not parsed:
+            continue
+        if os.path.normpath(os.path.join(FS_DIR, entry_name)) in referenced:
+            continue
+        free_indices.setdefault(parsed[0], []).append(parsed[1])
+
+    free_blocks = 0
+    free_extents = 0
+    for indices in free_indices.values():
+        indices.sort()
+        free_blocks += len(indices)
+        free_extents += 1 + sum(1 for a, b in zip(indices, indices[1:]) if b != a + 1)
+
+    fragmented = sum(1 for info in files.values() if info["fragmentos"] > 1)
+    return {
+        "archivos": files,
+        "archivos_fragmentados": fragmented,
+        "fragmentos_totales": total_runs,
+        "longitud_media_run": (total_blocks / total_runs) if total_runs else 0.0,
+        "bloques_libres": free_blocks,
+        "extensiones_libres": free_extents,
+        # 0.0 = espacio libre contiguo, tiende a 1.0 cuando cada bloque libre es un hueco aislado
+        "fragmentacion_espacio_libre": ((free_extents - 1) / (free_blocks - 1)) if free_blocks > 1 else 0.0,
+    }
+
+class OnlineDefragmenter:
+    """Reubica cadenas fragmentadas en runs contiguos, unos pocos bloques por paso.
+
+    La búsqueda de la próxima cadena fragmentada recorre la FAT con un cursor que sigue
+    entre trabajos y sin tomar ``controller.lock``; cada paso lo toma solo para comprobar
+    que la cadena elegida no cambió y copiar ``blocks_per_step`` bloques, así las
+    lecturas del controlador se intercalan entre pasos. La cadena original
+    sigue siendo la válida hasta que la copia está completa; recién entonces se cambia
+    ``ruta_datos_inicial`` y se borran los bloques viejos.
+    """
+
+    def __init__(self, controller, blocks_per_step: int = 8, pause: float = 0.01):
+        self.controller = controller
+        self.blocks_per_step = blocks_per_step
+        self.pause = pause
+        self.moved_blocks = 0
+        self.relocated_files = 0
+        self._job = None
+        self._names: Optional[Iterator[str]] = None
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _next_job(self) -> Optional[Dict]:
+        # Fuera del lock: la cadena se revalida en step() antes de copiar
+        if self._names is None:
+            with self.controller.lock:
+                self._names = iter(list(self.controller.fat["files"]))
+        for name in self._names:
+            # Solo la consulta de la entrada va bajo el lock: una FAT binaria puede estar
+            # reabriéndose en un flush
+            with self.controller.lock:
+                entry = self.controller.fat["files"].get(name)
+                snapshot = None if entry is None else (entry.get("ruta_datos_inicial"), entry.get("fecha_modificacion"))
+            if snapshot is None:
+                continue
+            origin, modified = snapshot
+            paths = chain_paths(origin)
+            if len(count_runs(paths)) <= 1:
+                continue
+            indices = [parsed[1] for parsed in map(parse_block_path, paths) if parsed]
+            start = (max(indices) + 1) if indices else 0
+            base = block_base(name)
+            while any(os.path.exists(get_block_path(f"{base}_{start + i}")) for i in range(len(paths))):
+                start += len(paths)
+            return {
+                "name": name,
+                "base": base,
+                "origen": origin,
+                "fecha_modificacion": modified,
+                "paths": paths,
+                "start": start,
+                "copied": 0,
+            }
+        # Fin de la pasada: la próxima vuelve a empezar con los nombres de ese momento
+        self._names = None
+        return None
+
+    def _discard(self, job: Dict):
+        # Si el archivo se reescribió, la cadena nueva puede reusar los nombres de la copia:
+        # esos bloques ya son del archivo y no se borran
+        entry = self.controller.fat["files"].get(job["name"])
+        live = {os.path.normpath(path) for path in chain_paths(entry.get("ruta_datos_inicial"))} if entry else set()
+        for i in range(job["copied"]):
+            target = get_block_path(f"{job['base']}_{job['start'] + i}")
+            if os.path.exists(target) and os.path.normpath(target) not in live:
+                remove_block(target)
+
+    def step(self) -> bool:
+        # Devuelve False cuando no queda nada por desfragmentar
+        if self._job is None:
+            self._job = self._next_job()
+            if self._job is None:
+                return False
+        with self.controller.lock:
+            job = self._job
+            entry = self.controller.fat["files"].get(job["name"])
+
+            # Si el archivo cambió mientras se copiaba, se descarta la copia parcial
+            if (entry is None or entry.get("ruta_datos_inicial") != job["origen"]
+                    or entry.get("fecha_modificacion") != job["fecha_modificacion"]):
+                self._discard(job)
+                self._job = None
+                return True
+
+            paths = job["paths"]
+            end = min(job["copied"] + self.blocks_per_step, len(paths))
+            for i in range(job["copied"], end):
+                block = read_block(paths[i])
+                is_eof = (i == len(paths) - 1)
+                next_block_path = None if is_eof else get_block_path(f"{job['base']}_{job['start'] + i + 1}")
+                write_block(get_block_path(f"{job['base']}_{job['start'] + i}"), block["datos"], next_block_path,
+                            is_eof, block.get("crc32"))
+            self.moved_blocks += end - job["copied"]
+            job["copied"] = end
+
+            if job["copied"] == len(paths):
+                entry["ruta_datos_inicial"] = get_block_path(f"{job['base']}_{job['start']}")
+                self.controller.refresh_version_blocks(entry)
+                # La FAT nueva tiene que estar en disco antes de borrar los bloques viejos
+                self.controller.mark_dirty(files=[job["name"]])
+                self.controller.flush()
+                for old_path in paths:
+                    if os.path.exists(old_path):
+                        remove_block(old_path)
+                self.relocated_files += 1
+                self._job = None
+        return True
+
+    def run(self, max_steps: Optional[int] = None):
+        steps = 0
+        while not self._stop.is_set() and (max_steps is None or steps < max_steps):
+            if not self.step():
+                break
+            steps += 1
+            # Throttling: cede el lock y el disco a la E/S en primer plano
+            if self.pause:
+                time.sleep(self.pause)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        # Una copia a medias no queda referenciada por nadie: se descarta
+        with self.controller.lock:
+            if self._job is not None:
+                self._discard(self._job)
+                self._job = None
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
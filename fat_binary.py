@@ -0,0 +1,396 @@
+import array
+import datetime
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from collections.abc import MutableMapping
+from functools import lru_cache
+from typing import Dict, Iterator, List, Optional
+
+# Formato binario de la FAT:
+#
+#   cabecera | registros de tamaño fijo | índice hash de nombres | tabla de strings
+#
+# Los nombres, owners, rutas y permisos van a una tabla de strings deduplicada y los
+# registros solo guardan su id. Desde la versión 2 los nombres ocupan los primeros ids,
+# en el orden de los registros, para poder listar decodificando solo ese tramo. Las fechas se guardan como microsegundos enteros desde
+# 1970-01-01 (hora local, igual que las fechas ISO que genera el controlador).
+MAGIC = b"FATB"
+VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+HEADER = struct.Struct("<4sHxxIQQQI")       # magic, versión, entradas, offs registros/índice/strings, slots
+RECORD = struct.Struct("<IIIIIB3xQqqq")     # nombre, ruta, owner, permisos, extra, papelera, total, fechas
+SLOT = struct.Struct("<I")
+STRING_OFFSET = struct.Struct("<I")
+
+NO_STRING = 0xFFFFFFFF
+NO_DATE = -(2 ** 63)
+EPOCH = datetime.datetime(1970, 1, 1)
+KNOWN_FIELDS = ("nombre", "ruta_datos_inicial", "papelera", "total_caracteres", "fecha_creacion",
+                "fecha_modificacion", "fecha_eliminacion", "owner", "permissions")
+
+def _date_to_int(value: Optional[str]) -> int:
+    if value is None:
+        return NO_DATE
+    return (datetime.datetime.fromisoformat(value) - EPOCH) // datetime.timedelta(microseconds=1)
+
+@lru_cache(maxsize=4096)
+def _int_to_date(value: int) -> Optional[str]:
+    if value == NO_DATE:
+        return None
+    return (EPOCH + datetime.timedelta(microseconds=value)).isoformat()
+
+def _name_hash(name: str) -> int:
+    return zlib.crc32(name.encode("utf-8"))
+
+def _u32_array(view: memoryview):
+    # El formato es little-endian; en esas máquinas se lee directo del mmap sin copiar
+    if sys.byteorder == "little":
+        return view.cast("I")
+    values = array.array("I", view.tobytes())
+    values.byteswap()
+    return values
+
+class _StringTable:
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[bytes] = []
+
+    def add(self, value: Optional[str]) -> int:
+        if value is None:
+            return NO_STRING
+        string_id = self.ids.get(value)
+        if string_id is None:
+            if "\0" in value:
+                raise ValueError(f"El string {value!r} no puede contener \\0.")
+            string_id = len(self.values)
+            self.ids[value] = string_id
+            self.values.append(value.encode("utf-8"))
+        return string_id
+
+    def to_bytes(self) -> bytes:
+        # Cada string termina en \0 para poder decodificar toda la tabla de una vez al listar
+        offsets = array.array("I", [len(self.values)])
+        position = 0
+        for value in self.values:
+            offsets.append(position)
+            position += len(value) + 1
+        offsets.append(position)
+        if sys.byteorder == "big":
+            offsets.byteswap()
+        return offsets.tobytes() + b"".join(value + b"\0" for value in self.values)
+
+def encode_fat(files) -> bytes:
+    strings = _StringTable()
+    records = bytearray()
+    items = list(files.items())
+    names = [name for name, _ in items]
+    for name in names:
+        strings.add(name)
+    for name, entry in items:
+        extra = {key: value for key, value in entry.items() if key not in KNOWN_FIELDS}
+        if entry.get("nombre", name) != name:
+            extra["nombre"] = entry["nombre"]
+        records += RECORD.pack(
+            strings.add(name),
+            strings.add(entry.get("ruta_datos_inicial")),
+            strings.add(entry.get("owner")),
+            strings.add(json.dumps(entry.get("permissions", {}), separators=(",", ":"), sort_keys=True)),
+            strings.add(json.dumps(extra, separators=(",", ":")) if extra else None),
+            1 if entry.get("papelera") else 0,
+            entry.get("total_caracteres", 0),
+            _date_to_int(entry.get("fecha_creacion")),
+            _date_to_int(entry.get("fecha_modificacion")),
+            _date_to_int(entry.get("fecha_eliminacion")),
+        )
+
+    # Índice hash con direccionamiento abierto; cada slot guarda el número de registro + 1
+    slot_count = 1
+    while slot_count < 2 * max(len(names), 1):
+        slot_count *= 2
+    slots = [0] * slot_count
+    for record_number, name in enumerate(names):
+        slot = _name_hash(name) & (slot_count - 1)
+        while slots[slot]:
+            slot = (slot + 1) & (slot_count - 1)
+        slots[slot] = record_number + 1
+    index = struct.pack(f"<{slot_count}I", *slots)
+
+    records_offset = HEADER.size
+    index_offset = records_offset + len(records)
+    strings_offset = index_offset + len(index)
+    header = HEADER.pack(MAGIC, VERSION, len(names), records_offset, index_offset, strings_offset, slot_count)
+    return header + bytes(records) + index + strings.to_bytes()
+
+def write_binary_fat(path: str, files):
+    data = encode_fat(files)
+    if isinstance(files, BinaryFat):
+        # En Windows no se puede reemplazar un archivo mapeado en memoria
+        files.close()
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    if isinstance(files, BinaryFat):
+        files.reopen(path)
+
+class BinaryFat(MutableMapping):
+    """Vista tipo dict de ``fat["files"]`` sobre un archivo binario mapeado en memoria.
+
+    Las entradas se decodifican recién cuando se accede a ellas y quedan cacheadas,
+    así los cambios que el controlador hace sobre el dict se conservan hasta el
+    siguiente ``write_binary_fat``.
+    """
+
+    def __init__(self, path: str):
+        self._decoded: Dict[str, Dict] = {}
+        self._deleted = set()
+        self._new: Dict[str, Dict] = {}
+        self._file = None
+        self._map = None
+        self.reopen(path)
+
+    def reopen(self, path: str):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, records_offset, index_offset, strings_offset, slot_count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version not in SUPPORTED_VERSIONS:
+            self.close()
+            raise ValueError(f"{path} no es una FAT binaria válida.")
+        string_count = STRING_OFFSET.unpack_from(self._map, strings_offset)[0]
+        offsets_start = strings_offset + STRING_OFFSET.size
+        self._string_data = offsets_start + STRING_OFFSET.size * (string_count + 1)
+
+        self._count = count
+        self._version = version
+        self._slot_count = slot_count
+        self._view = memoryview(self._map)
+        self._records = self._view[records_offset:records_offset + RECORD.size * count]
+        self._columns = _u32_array(self._records)
+        self._slots = _u32_array(self._view[index_offset:index_offset + SLOT.size * slot_count])
+        self._offsets = _u32_array(self._view[offsets_start:self._string_data])
+        # Owners y permisos se repiten mucho y están deduplicados: se decodifican una sola vez
+        self._owners: Dict[int, Optional[str]] = {}
+        self._perms: Dict[int, Dict] = {}
+
+        # Lo ya decodificado sigue siendo válido: es el estado más reciente de cada entrada
+        self._deleted = set()
+        self._new = {name: entry for name, entry in self._decoded.items() if self._find(name) is None}
+
+    def close(self):
+        if self._map is None:
+            return
+        # mmap no se puede cerrar mientras haya memoryviews exportados
+        for view in ("_columns", "_records", "_slots", "_offsets", "_view"):
+            buffer = getattr(self, view, None)
+            if isinstance(buffer, memoryview):
+                buffer.release()
+        self._map.close()
+        self._file.close()
+        self._map = None
+        self._file = None
+
+    def _string(self, string_id: int) -> Optional[str]:
+        if string_id == NO_STRING:
+            return None
+        start = self._string_data + self._offsets[string_id]
+        end = self._string_data + self._offsets[string_id + 1] - 1
+        return str(self._view[start:end], "utf-8")
+
+    def _owner(self, string_id: int) -> Optional[str]:
+        owner = self._owners.get(string_id)
+        if owner is None:
+            owner = self._owners[string_id] = self._string(string_id)
+        return owner
+
+    def _permissions(self, string_id: int) -> Dict:
+        perms = self._perms.get(string_id)
+        if perms is None:
+            perms = self._perms[string_id] = json.loads(self._string(string_id))
+        # Cada entrada recibe su propia copia porque manage_permissions la modifica
+        if not perms:
+            return {}
+        return {user: list(values) for user, values in perms.items()}
+
+    def _record(self, record_number: int) -> tuple:
+        return RECORD.unpack_from(self._records, RECORD.size * record_number)
+
+    def _find(self, name: str) -> Optional[int]:
+        if self._count == 0:
+            return None
+        slot = _name_hash(name) & (self._slot_count - 1)
+        while True:
+            value = self._slots[slot]
+            if value == 0:
+                return None
+            if self._string(self._record(value - 1)[0]) == name:
+                return value - 1
+            slot = (slot + 1) & (self._slot_count - 1)
+
+    def _all_strings(self) -> List[str]:
+        return str(self._view[self._string_data:], "utf-8").split("\0")
+
+    def _names_in_order(self) -> List[str]:
+        # Versión 2: el nombre del registro i es el string i
+        end = self._string_data + self._offsets[self._count] - 1
+        return str(self._view[self._string_data:end], "utf-8").split("\0")
+
+    def _decode(self, record: tuple, strings: Optional[List[str]] = None) -> Dict:
+        name_id, ruta_id, owner_id, perms_id, extra_id, papelera, total, creacion, modificacion, eliminacion = record
+        entry = {
+            "nombre": strings[name_id] if strings else self._string(name_id),
+            "ruta_datos_inicial": (strings[ruta_id] if ruta_id != NO_STRING else None) if strings else self._string(ruta_id),
+            "papelera": bool(papelera),
+            "total_caracteres": total,
+            "fecha_creacion": _int_to_date(creacion),
+            "fecha_modificacion": _int_to_date(modificacion),
+            "fecha_eliminacion": _int_to_date(eliminacion),
+            "owner": self._owner(owner_id),
+            "permissions": self._permissions(perms_id),
+        }
+        if extra_id != NO_STRING:
+            entry.update(json.loads(self._string(extra_id)))
+        return entry
+
+    def __getitem__(self, name: str) -> Dict:
+        if name in self._deleted:
+            raise KeyError(name)
+        entry = self._decoded.get(name)
+        if entry is None:
+            record_number = self._find(name)
+            if record_number is None:
+                raise KeyError(name)
+            entry = self._decoded[name] = self._decode(self._record(record_number))
+        return entry
+
+    def __contains__(self, name) -> bool:
+        if name in self._deleted:
+            return False
+        return name in self._decoded or self._find(name) is not None
+
+    def __setitem__(self, name: str, entry: Dict):
+        self._deleted.discard(name)
+        if name not in self._decoded and self._find(name) is None:
+            self._new[name] = entry
+        self._decoded[name] = entry
+
+    def __delitem__(self, name: str):
+        if name not in self:
+            raise KeyError(name)
+        self._decoded.pop(name, None)
+        if self._new.pop(name, None) is None:
+            self._deleted.add(name)
+
+    def iter_names(self) -> Iterator[str]:
+        # Solo decodifica los nombres, sin tocar el resto de cada registro
+        strings = self._all_strings() if self._count else None
+        for record in RECORD.iter_unpack(self._records):
+            name = strings[record[0]]
+            if name not in self._deleted:
+                yield name
+        yield from list(self._new)
+
+    def list_names(self, is_trash: bool = False, visible_to: Optional[str] = None) -> List[str]:
+        # Camino rápido para listar: lee columnas de los registros (campos u32 con paso
+        # RECORD.size / 4) sin decodificar entradas completas. visible_to=None = sin filtro
+        # de permisos; si no, solo lo que ese usuario es dueño o puede leer.
+        # Las entradas ya decodificadas pueden haber cambiado en memoria: ahí manda el dict
+        if self._decoded or self._deleted:
+            return self._list_names_slow(is_trash, visible_to)
+        if not self._count:
+            return []
+        stride = RECORD.size // 4
+        flags = self._columns[5::stride].tolist()
+        trash_flag = 1 if is_trash else 0
+        if visible_to is None and self._version >= 2:
+            return [name for name, f in zip(self._names_in_order(), flags) if (f & 0xFF) == trash_flag]
+
+        strings = self._all_strings()
+        name_ids = self._columns[0::stride].tolist()
+        if visible_to is None:
+            return [strings[n] for n, f in zip(name_ids, flags) if (f & 0xFF) == trash_flag]
+
+        owner_ids = self._columns[2::stride].tolist()
+        perm_ids = self._columns[3::stride].tolist()
+        try:
+            user_id = strings.index(visible_to)
+        except ValueError:
+            user_id = NO_STRING
+        readable = {p for p in set(perm_ids) if "lectura" in json.loads(strings[p]).get(visible_to, [])}
+        return [
+            strings[n] for n, f, o, p in zip(name_ids, flags, owner_ids, perm_ids)
+            if (f & 0xFF) == trash_flag and (o == user_id or p in readable)
+        ]
+
+    def _list_names_slow(self, is_trash: bool, visible_to: Optional[str]) -> List[str]:
+        names = []
+        for name, entry in self.items():
+            if entry["papelera"] != is_trash:
+                continue
+            if visible_to is not None and entry["owner"] != visible_to and \
+                    "lectura" not in entry.get("permissions", {}).get(visible_to, []):
+                continue
+            names.append(name)
+        return names
+
+    def __iter__(self) -> Iterator[str]:
+        return self.iter_names()
+
+    def __len__(self) -> int:
+        return self._count - len(self._deleted) + len(self._new)
+
+    def items(self):
+        decoded = self._decoded
+        deleted = self._deleted
+        # Un recorrido completo decodifica la tabla de strings de una sola vez
+        strings = self._all_strings() if self._count else None
+        for record in RECORD.iter_unpack(self._records):
+            name = strings[record[0]]
+            if name in deleted:
+                continue
+            entry = decoded.get(name)
+            if entry is None:
+                entry = decoded[name] = self._decode(record, strings)
+            yield name, entry
+        yield from list(self._new.items())
+
+def load_binary_fat(path: str) -> Dict:
+    return {"files": BinaryFat(path)}
+
+def json_to_binary(json_path: str, bin_path: str):
+    with open(json_path, 'r') as f:
+        fat = json.load(f)
+    write_binary_fat(bin_path, fat["files"])
+
+def binary_to_json(bin_path: str, json_path: str):
+    files = BinaryFat(bin_path)
+    with open(json_path, 'w') as f:
+        json.dump({"files": dict(files.items())}, f, indent=4)
+    files.close()
+
+def main():
+    # Imports locales: este módulo lo carga main_logic y no debe pagar argparse al arrancar
+    import argparse
+    from main_logic import FAT_FILE, FAT_BIN_FILE
+
+    parser = argparse.ArgumentParser(description="Conversión de la FAT entre JSON y binario")
+    parser.add_argument("direccion", choices=["a-binario", "a-json"])
+    args = parser.parse_args()
+
+    # El formato anterior se conserva como .bak; load_fat prioriza fat_table.bin si existe
+    if args.direccion == "a-binario":
+        json_to_binary(FAT_FILE, FAT_BIN_FILE)
+        os.replace(FAT_FILE, FAT_FILE + ".bak")
+        print(f"FAT convertida a {FAT_BIN_FILE}")
+    else:
+        binary_to_json(FAT_BIN_FILE, FAT_FILE)
+        os.replace(FAT_BIN_FILE, FAT_BIN_FILE + ".bak")
+        print(f"FAT convertida a {FAT_FILE}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""CLI sin interfaz gráfica del simulador FAT.
+
+Uso:
+    python -m fat_cli [--user U] [--password P | --token T] <comando> [args...]
+    python -m fat_cli [--user U] [--password P | --token T] batch < comandos.txt
+
+Comandos: ls [--papelera] [-l] [DIRECTORIO], cat NOMBRE, create NOMBRE [CONTENIDO], rm NOMBRE,
+restore NOMBRE, chmod NOMBRE USUARIO (+|-)(lectura|escritura), search FRASE, df,
+mkdir DIRECTORIO, rmdir DIRECTORIO, mv ORIGEN DESTINO, token, logout. Los nombres pueden ser rutas
+"dir/sub/nombre". token imprime un token de sesión que las invocaciones siguientes usan con
+--token (o FAT_TOKEN) sin volver a pasar por el hash lento de la contraseña; logout lo revoca.
+
+Las credenciales también se pueden pasar con FAT_USER / FAT_PASSWORD; con FAT_TRACE=ARCHIVO
+la sesión se graba como traza para loadgen.py y con FAT_MIRROR=DIRECTORIO se replica a un
+espejo (replication.py). En modo batch se lee un comando por línea desde stdin y todos
+comparten la misma sesión, así la FAT se carga una sola vez.
+"""
+import os
+import sys
+from typing import List, TextIO
+
+# Solo la capa lógica: nada de PyQt5 para que el arranque sea rápido
+from main_logic import FileSystemController
+
+USAGE = ("Uso: python -m fat_cli [--user U] [--password P | --token T] "
+         "<ls|cat|create|rm|restore|chmod|search|df|mkdir|rmdir|mv|token|logout|batch> [args...]")
+
+def _cmd_ls(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    is_trash = "--papelera" in args
+    paths = [arg for arg in args if not arg.startswith("-")]
+    if paths:
+        # Listado de un directorio: solo sus hijos, los directorios con "/" al final
+        for child in controller.list_dir(paths[0], is_trash=is_trash):
+            label = child["name"] + ("/" if child["tipo"] == "directorio" else "")
+            if "-l" in args and child["tipo"] == "archivo":
+                date_info = child["fecha_eliminacion"] if is_trash else child["fecha_modificacion"]
+                out.write(f"{label:<20} {child['owner']:<15} {child['total_caracteres']:>8} {date_info}\n")
+            else:
+                out.write(label + "\n")
+        return True
+    if "-l" in args:
+        for file in controller.get_list_files(is_trash=is_trash):
+            if is_trash or controller.has_read_permission_logic(file):
+                date_info = file["fecha_eliminacion"] if is_trash else file["fecha_modificacion"]
+                out.write(f"{file['name']:<20} {file['owner']:<15} {file['total_caracteres']:>8} {date_info}\n")
+        return True
+    names = controller.list_file_names(is_trash=is_trash)
+    if names:
+        out.write("\n".join(names) + "\n")
+    return True
+
+def _cmd_cat(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    result = controller.open_file(args[0])
+    if "error" in result:
+        out.write(f"Error: {result['error']}\n")
+        return False
+    out.write(result["content"] + "\n")
+    return True
+
+def _cmd_create(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    content = " ".join(args[1:]) if len(args) > 1 else sys.stdin.read()
+    return _report(controller.create_file(args[0], content.strip()), out)
+
+def _cmd_rm(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    return _report(controller.delete_file(args[0]), out)
+
+def _cmd_restore(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    return _report(controller.recover_file(args[0]), out)
+
+def _cmd_chmod(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    name, target_user, change = args[0], args[1], args[2]
+    if change[:1] not in "+-" or len(change) < 2:
+        out.write("Error: El permiso debe ser +lectura, -lectura, +escritura o -escritura.\n")
+        return False
+    return _report(controller.manage_permissions(name, target_user, change[1:], change[0] == "+"), out)
+
+def _cmd_search(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    for result in controller.search(" ".join(args)):
+        out.write(f"{result['name']}: {result['coincidencias']} coincidencia(s) en {result['offsets']}\n")
+    return True
+
+def _cmd_df(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    usage = controller.get_usage()
+    rows = [("(volumen)", usage["volumen"])]
+    if controller.is_admin():
+        rows += sorted(usage["usuarios"].items())
+    elif controller.current_user in usage["usuarios"]:
+        rows.append((controller.current_user, usage["usuarios"][controller.current_user]))
+    out.write(f"{'':15} {'archivos':>9} {'chars':>10} {'papelera':>10} {'bloques':>9}\n")
+    for label, counters in rows:
+        out.write(f"{label:15} {counters['archivos']:>9} {counters['caracteres']:>10} "
+                  f"{counters['papelera_caracteres']:>10} {counters['bloques']:>9}\n")
+    return True
+
+def _cmd_mkdir(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    return _report(controller.mkdir(args[0]), out)
+
+def _cmd_rmdir(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    return _report(controller.rmdir(args[0]), out)
+
+def _cmd_mv(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    return _report(controller.move(args[0], args[1]), out)
+
+def _cmd_token(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    out.write(controller.issue_token() + "\n")
+    return True
+
+def _cmd_logout(controller: FileSystemController, args: List[str], out: TextIO) -> bool:
+    if not controller.session_token:
+        out.write("Error: La sesión no usa un token.\n")
+        return False
+    controller.logout(revoke=True)
+    out.write("Éxito: Token revocado.\n")
+    return True
+
+def _report(result: str, out: TextIO) -> bool:
+    out.write(result + "\n")
+    return result.startswith("Éxito")
+
+# nombre -> (función, cantidad mínima de argumentos)
+COMMANDS = {
+    "ls": (_cmd_ls, 0),
+    "cat": (_cmd_cat, 1),
+    "create": (_cmd_create, 1),
+    "rm": (_cmd_rm, 1),
+    "restore": (_cmd_restore, 1),
+    "chmod": (_cmd_chmod, 3),
+    "search": (_cmd_search, 1),
+    "df": (_cmd_df, 0),
+    "mkdir": (_cmd_mkdir, 1),
+    "rmdir": (_cmd_rmdir, 1),
+    "mv": (_cmd_mv, 2),
+    "token": (_cmd_token, 0),
+    "logout": (_cmd_logout, 0),
+}
+
+def run_command(controller: FileSystemController, argv: List[str], out: TextIO = sys.stdout) -> bool:
+    if not argv:
+        return True
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        out.write(f"Error: Comando desconocido '{argv[0]}'.\n")
+        return False
+    handler, min_args = command
+    if len(argv) - 1 < min_args:
+        out.write(f"Error: '{argv[0]}' requiere {min_args} argumento(s).\n")
+        return False
+    return handler(controller, argv[1:], out)
+
+def run_batch(controller: FileSystemController, lines: TextIO, out: TextIO = sys.stdout) -> int:
+    import shlex
+
+    failures = 0
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        try:
+            argv = shlex.split(line)
+        except ValueError as e:
+            out.write(f"Error: {e}\n")
+            failures += 1
+            continue
+        # En batch el contenido de create va en la línea; stdin son los comandos
+        if argv[0] == "create" and len(argv) < 3:
+            out.write("Error: En modo batch 'create' requiere NOMBRE y CONTENIDO.\n")
+            failures += 1
+            continue
+        if not run_command(controller, argv, out):
+            failures += 1
+    return failures
+
+def main(argv: List[str] = None) -> int:
+    argv = list(sys.argv[1:] if argv is None else argv)
+    user = os.environ.get("FAT_USER")
+    password = os.environ.get("FAT_PASSWORD")
+    token = os.environ.get("FAT_TOKEN")
+    while argv and argv[0] in ("--user", "--password", "--token"):
+        if len(argv) < 2:
+            print(USAGE, file=sys.stderr)
+            return 2
+        if argv[0] == "--user":
+            user = argv[1]
+        elif argv[0] == "--token":
+            token = argv[1]
+        else:
+            password = argv[1]
+        argv = argv[2:]
+
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0 if argv else 2
+
+    controller = FileSystemController()
+    if os.environ.get("FAT_TRACE"):
+        # Grabación de la sesión para python loadgen.py reproducir
+        from loadgen import record_session
+        record_session(controller, os.environ["FAT_TRACE"])
+    replicator = None
+    if os.environ.get("FAT_MIRROR"):
+        from replication import start_mirror
+        replicator = start_mirror(os.environ["FAT_MIRROR"])
+    if token and not password:
+        authenticated = controller.authenticate_token(token)
+    else:
+        authenticated = bool(user) and controller.authenticate(user, password or "")
+    if not authenticated:
+        print("Error: Usuario o contraseña incorrectos.", file=sys.stderr)
+        if replicator is not None:
+            replicator.stop()
+        return 1
+
+    try:
+        if argv[0] == "batch":
+            return 1 if run_batch(controller, sys.stdin) else 0
+        return 0 if run_command(controller, argv) else 1
+    finally:
+        controller.shutdown()
+        if replicator is not None:
+            # Después del shutdown: los metadatos escritos al salir también llegan al espejo
+            replicator.stop()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import datetime
+import json
+import sys
+from collections.abc import Mapping, MutableMapping
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+# Representación compacta en memoria de las entradas de la FAT. Cada entrada es un objeto
+# con __slots__ en lugar de un dict de strings: owners y codificación internados, fechas
+# como microsegundos enteros desde 1970, papelera y campos opcionales en un byte de flags
+# y permisos como bitmasks por usuario.
+FLAG_TRASH = 1
+FLAG_HAS_BYTES = 2        # las entradas anteriores al almacenamiento por bytes no tienen
+FLAG_HAS_ENCODING = 4     # "total_bytes" ni "codificacion"
+PERMISSION_BITS = {"lectura": 1, "escritura": 2}
+ACTION_BITS = {"read": 1, "write": 2}
+FIELDS = ("nombre", "ruta_datos_inicial", "papelera", "total_caracteres", "total_bytes", "codificacion",
+          "fecha_creacion", "fecha_modificacion", "fecha_eliminacion", "owner", "permissions")
+FIELD_SET = frozenset(FIELDS)
+DATE_SLOTS = {"fecha_creacion": "_created", "fecha_modificacion": "_modified", "fecha_eliminacion": "_deleted"}
+
+EPOCH = datetime.datetime(1970, 1, 1)
+EPOCH_ORDINAL = EPOCH.toordinal()
+
+def _to_date_int(value: Optional[str]) -> Optional[int]:
+    # Mismo valor que fat_binary._date_to_int (microsegundos desde 1970) sin restar datetimes
+    if value is None:
+        return None
+    date = datetime.datetime.fromisoformat(value)
+    seconds = (date.toordinal() - EPOCH_ORDINAL) * 86400 + date.hour * 3600 + date.minute * 60 + date.second
+    return seconds * 1000000 + date.microsecond
+
+@lru_cache(maxsize=4096)
+def _from_date_int(value: int) -> str:
+    # Inversa de _to_date_int; sin depender de fat_binary, que solo se importa con FAT binaria
+    return (EPOCH + datetime.timedelta(microseconds=value)).isoformat()
+
+def _encode_permissions(perms: Mapping) -> Optional[Tuple]:
+    # {"ana": ["lectura"], "beto": []} -> ("ana", 1); sin permisos -> None
+    pairs = []
+    for user, values in perms.items():
+        mask = 0
+        for value in values:
+            mask |= PERMISSION_BITS[value]
+        if mask:
+            pairs += (sys.intern(user), mask)
+    return tuple(pairs) or None
+
+class CompactEntry(MutableMapping):
+    """Entrada de la FAT con la interfaz de un dict (``entry["papelera"]``, ``**entry``,
+    ``entry.get(...)``).
+
+    ``entry["permissions"]`` devuelve un dict nuevo en cada acceso: para cambiar permisos
+    hay que asignarlo completo (``entry["permissions"] = perms``).
+    """
+
+    __slots__ = ("_name", "_path", "_owner", "_encoding", "_flags", "_chars", "_bytes",
+                 "_created", "_modified", "_deleted", "_perms", "_extra")
+
+    def __init__(self, fields: Mapping):
+        # Asignación directa (sin pasar por __setitem__): es el camino de carga de la FAT
+        get = fields.get
+        owner = get("owner")
+        encoding = get("codificacion")
+        perms = get("permissions")
+        self._name = get("nombre")
+        self._path = get("ruta_datos_inicial")
+        self._owner = None if owner is None else sys.intern(owner)
+        self._encoding = None if encoding is None else sys.intern(encoding)
+        self._flags = ((FLAG_TRASH if get("papelera") else 0)
+                       | (FLAG_HAS_BYTES if "total_bytes" in fields else 0)
+                       | (FLAG_HAS_ENCODING if "codificacion" in fields else 0))
+        self._chars = get("total_caracteres", 0)
+        self._bytes = get("total_bytes", 0)
+        self._created = _to_date_int(get("fecha_creacion"))
+        self._modified = _to_date_int(get("fecha_modificacion"))
+        self._deleted = _to_date_int(get("fecha_eliminacion"))
+        self._perms: Optional[Tuple] = _encode_permissions(perms) if perms else None
+        self._extra: Optional[Dict] = None
+        if not FIELD_SET.issuperset(fields):
+            self._extra = {key: value for key, value in fields.items() if key not in FIELD_SET}
+
+    def __getitem__(self, key: str):
+        if key == "nombre":
+            return self._name
+        if key == "ruta_datos_inicial":
+            return self._path
+        if key == "papelera":
+            return bool(self._flags & FLAG_TRASH)
+        if key == "total_caracteres":
+            return self._chars
+        if key == "total_bytes" and self._flags & FLAG_HAS_BYTES:
+            return self._bytes
+        if key == "codificacion" and self._flags & FLAG_HAS_ENCODING:
+            return self._encoding
+        if key in DATE_SLOTS:
+            value = getattr(self, DATE_SLOTS[key])
+            return None if value is None else _from_date_int(value)
+        if key == "owner":
+            return self._owner
+        if key == "permissions":
+            perms = self._perms or ()
+            return {perms[i]: [perm for perm, bit in PERMISSION_BITS.items() if perms[i + 1] & bit]
+                    for i in range(0, len(perms), 2)}
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value):
+        if key == "nombre":
+            self._name = value
+        elif key == "ruta_datos_inicial":
+            self._path = value
+        elif key == "papelera":
+            self._flags = self._flags | FLAG_TRASH if value else self._flags & ~FLAG_TRASH
+        elif key == "total_caracteres":
+            self._chars = value
+        elif key == "total_bytes":
+            self._bytes = value
+            self._flags |= FLAG_HAS_BYTES
+        elif key == "codificacion":
+            self._encoding = None if value is None else sys.intern(value)
+            self._flags |= FLAG_HAS_ENCODING
+        elif key in DATE_SLOTS:
+            setattr(self, DATE_SLOTS[key], _to_date_int(value))
+        elif key == "owner":
+            self._owner = None if value is None else sys.intern(value)
+        elif key == "permissions":
+            self._perms = _encode_permissions(value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key: str):
+        if key == "total_bytes" and self._flags & FLAG_HAS_BYTES:
+            self._flags &= ~FLAG_HAS_BYTES
+        elif key == "codificacion" and self._flags & FLAG_HAS_ENCODING:
+            self._flags &= ~FLAG_HAS_ENCODING
+            self._encoding = None
+        elif self._extra is not None and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        for key in FIELDS:
+            if key == "total_bytes" and not self._flags & FLAG_HAS_BYTES:
+                continue
+            if key == "codificacion" and not self._flags & FLAG_HAS_ENCODING:
+                continue
+            yield key
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+    def allows(self, user: str, action: str) -> bool:
+        # has_permission sin armar el dict de permisos
+        perms = self._perms or ()
+        bit = ACTION_BITS.get(action, 0)
+        for i in range(0, len(perms), 2):
+            if perms[i] == user:
+                return bool(perms[i + 1] & bit)
+        return False
+
+def compact_entry(entry: Mapping) -> CompactEntry:
+    return entry if isinstance(entry, CompactEntry) else CompactEntry(entry)
+
+def _object_hook(obj: Dict):
+    # json.load arma los dicts de adentro hacia afuera: cada entrada se compacta apenas se
+    # termina de leer, sin que la FAT completa llegue a existir como dicts
+    if "ruta_datos_inicial" in obj and "owner" in obj:
+        return CompactEntry(obj)
+    return obj
+
+def load_compact_fat(f) -> Dict:
+    fat = json.load(f, object_hook=_object_hook)
+    files = fat.get("files", {})
+    # La clave del dict y "nombre" son el mismo string: se comparte un solo objeto
+    fat["files"] = {entry["nombre"] if entry["nombre"] == name else name: entry for name, entry in files.items()}
+    return fat
+
+def to_json(value):
+    # default= de json.dump para las entradas compactas
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"{type(value).__name__} no es serializable a JSON")
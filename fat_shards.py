@@ -0,0 +1,202 @@
+import json
+import os
+import shutil
+import threading
+import zlib
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fat_compact import load_compact_fat, to_json
+
+# FAT particionada: fat_shards/meta.json guarda la cantidad de shards y cada
+# fat_shards/shard_XXXX.json guarda {"generacion": g, "files": {...}} con las entradas
+# cuyo nombre cae en ese shard por hash. Guardar un cambio reescribe solo su shard.
+DEFAULT_SHARDS = 64
+META_FILE = "meta.json"
+FORMAT_VERSION = 1
+
+def shard_of(name: str, shard_count: int) -> int:
+    return zlib.crc32(name.encode("utf-8")) % shard_count
+
+def shard_path(shard_dir: str, shard: int) -> str:
+    return os.path.join(shard_dir, f"shard_{shard:04d}.json")
+
+def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def _write_json(path: str, data: Dict):
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, default=to_json)
+    os.replace(tmp_path, path)
+
+def format_shards(shard_dir: str, files: Iterable[Tuple[str, Dict]], shard_count: int = DEFAULT_SHARDS):
+    # Escribe un volumen particionado nuevo (formateo o reparticionado, sin conexiones abiertas)
+    os.makedirs(shard_dir)
+    shards: List[Dict[str, Dict]] = [{} for _ in range(shard_count)]
+    for name, entry in files:
+        shards[shard_of(name, shard_count)][name] = entry
+    for shard, shard_files in enumerate(shards):
+        _write_json(shard_path(shard_dir, shard), {"generacion": 0, "files": shard_files})
+    _write_json(os.path.join(shard_dir, META_FILE), {"version": FORMAT_VERSION, "shards": shard_count})
+
+class ShardedFat(MutableMapping):
+    """Vista tipo dict de ``fat["files"]`` sobre una FAT particionada por hash del nombre.
+
+    Cada shard se carga al primer acceso a uno de sus nombres. Los cambios se anotan
+    por nombre (``__setitem__``, ``__delitem__`` o ``touch`` para cambios hechos sobre
+    la entrada) y ``save`` escribe solo los shards con cambios. Si otro proceso
+    reescribió un shard, antes de guardarlo se recarga y se vuelven a aplicar encima
+    las entradas propias.
+    """
+
+    def __init__(self, shard_dir: str):
+        self.shard_dir = shard_dir
+        with open(os.path.join(shard_dir, META_FILE), 'r') as f:
+            self.shard_count = json.load(f)["shards"]
+        self._shards: List[Optional[Dict[str, Dict]]] = [None] * self.shard_count
+        self._generations = [0] * self.shard_count
+        self._stamps: List[Optional[Tuple[int, int, int]]] = [None] * self.shard_count
+        self._dirty: Dict[int, Set[str]] = {}
+        self.bytes_written = 0
+        self.last_saved: List[str] = []
+
+    def _shard(self, shard: int) -> Dict[str, Dict]:
+        files = self._shards[shard]
+        if files is None:
+            path = shard_path(self.shard_dir, shard)
+            self._stamps[shard] = _stamp(path)
+            with open(path, 'r') as f:
+                data = load_compact_fat(f)
+            files = self._shards[shard] = data["files"]
+            self._generations[shard] = data["generacion"]
+        return files
+
+    def __getitem__(self, name: str) -> Dict:
+        return self._shard(shard_of(name, self.shard_count))[name]
+
+    def __contains__(self, name) -> bool:
+        return name in self._shard(shard_of(name, self.shard_count))
+
+    def __setitem__(self, name: str, entry: Dict):
+        shard = shard_of(name, self.shard_count)
+        self._shard(shard)[name] = entry
+        self._dirty.setdefault(shard, set()).add(name)
+
+    def __delitem__(self, name: str):
+        shard = shard_of(name, self.shard_count)
+        del self._shard(shard)[name]
+        self._dirty.setdefault(shard, set()).add(name)
+
+    def touch(self, names: Iterable[str]):
+        # Entradas modificadas en el lugar (entry["papelera"] = True, ...)
+        for name in names:
+            self._dirty.setdefault(shard_of(name, self.shard_count), set()).add(name)
+
+    def __iter__(self) -> Iterator[str]:
+        for shard in range(self.shard_count):
+            yield from list(self._shard(shard))
+
+    def __len__(self) -> int:
+        return sum(len(self._shard(shard)) for shard in range(self.shard_count))
+
+    def items(self):
+        for shard in range(self.shard_count):
+            yield from list(self._shard(shard).items())
+
+    def _merge(self, shard: int):
+        # Recarga un shard que cambió en disco y vuelve a aplicar las entradas propias sin guardar
+        mine = {name: self._shards[shard].get(name) for name in self._dirty.get(shard, ())}
+        self._shards[shard] = None
+        files = self._shard(shard)
+        for name, entry in mine.items():
+            if entry is None:
+                files.pop(name, None)
+            else:
+                files[name] = entry
+
+    def refresh(self) -> bool:
+        # Revalidación: solo los shards ya cargados, comparando mtime/tamaño/inodo
+        changed = False
+        for shard, files in enumerate(self._shards):
+            if files is not None and _stamp(shard_path(self.shard_dir, shard)) != self._stamps[shard]:
+                self._merge(shard)
+                changed = True
+        return changed
+
+    def save(self, force: bool = False) -> int:
+        # Escribe los shards con cambios (force: todos los cargados, sin combinar). Devuelve
+        # la cantidad de shards escritos
+        shards = [s for s, files in enumerate(self._shards) if files is not None] if force else sorted(self._dirty)
+        self.last_saved = [shard_path(self.shard_dir, shard) for shard in shards]
+        for shard in shards:
+            path = shard_path(self.shard_dir, shard)
+            if not force and _stamp(path) != self._stamps[shard]:
+                self._merge(shard)
+            self._generations[shard] += 1
+            _write_json(path, {"generacion": self._generations[shard], "files": self._shards[shard]})
+            self._stamps[shard] = _stamp(path)
+            self.bytes_written += self._stamps[shard][1]
+        self._dirty.clear()
+        return len(shards)
+
+    def generation(self, shard: int) -> int:
+        self._shard(shard)
+        return self._generations[shard]
+
+def load_sharded_fat(shard_dir: str) -> Dict:
+    return {"files": ShardedFat(shard_dir)}
+
+def _backup_dir(shard_dir: str):
+    backup = shard_dir + ".bak"
+    if os.path.exists(backup):
+        shutil.rmtree(backup)
+    os.replace(shard_dir, backup)
+
+def reshard(shard_dir: str, shard_count: int):
+    # Offline: se arma el volumen nuevo al lado y se cambia de una vez; el anterior queda como .bak
+    files = ShardedFat(shard_dir)
+    new_dir = shard_dir + ".nuevo"
+    if os.path.exists(new_dir):
+        shutil.rmtree(new_dir)
+    format_shards(new_dir, files.items(), shard_count)
+    _backup_dir(shard_dir)
+    os.replace(new_dir, shard_dir)
+
+def main():
+    # Imports locales: main_logic importa este módulo
+    import argparse
+    from main_logic import FAT_BIN_FILE, FAT_FILE, FAT_SHARDS_DIR, load_fat
+
+    parser = argparse.ArgumentParser(description="FAT particionada en shards (operaciones offline)")
+    parser.add_argument("accion", choices=["formatear", "reparticionar", "a-json"])
+    parser.add_argument("--shards", type=int, default=DEFAULT_SHARDS)
+    args = parser.parse_args()
+    if args.shards < 1:
+        parser.error("--shards debe ser al menos 1")
+
+    if args.accion == "formatear":
+        if os.path.isdir(FAT_SHARDS_DIR):
+            parser.error(f"{FAT_SHARDS_DIR} ya existe; use reparticionar")
+        format_shards(FAT_SHARDS_DIR, load_fat()["files"].items(), args.shards)
+        # La FAT anterior se conserva como .bak; load_fat prioriza los shards
+        for path in (FAT_FILE, FAT_BIN_FILE):
+            if os.path.exists(path):
+                os.replace(path, path + ".bak")
+        print(f"FAT particionada en {args.shards} shards en {FAT_SHARDS_DIR}")
+    elif args.accion == "reparticionar":
+        reshard(FAT_SHARDS_DIR, args.shards)
+        print(f"FAT reparticionada en {args.shards} shards (anterior en {FAT_SHARDS_DIR}.bak)")
+    else:
+        files = ShardedFat(FAT_SHARDS_DIR)
+        with open(FAT_FILE, 'w') as f:
+            json.dump({"files": dict(files.items())}, f, indent=4, default=to_json)
+        _backup_dir(FAT_SHARDS_DIR)
+        print(f"FAT convertida a {FAT_FILE}")
+
+if __name__ == "__main__":
+    main()
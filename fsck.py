@@ -0,0 +1,281 @@
+import argparse
+import datetime
+import os
+import shutil
+import tempfile
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from fat_compact import compact_entry
+from main_logic import (FS_DIR, TEXT_ENCODING, FileSystemController, block_checksum, get_block_path,
+                        read_block, read_file_bytes, remove_block, write_block)
+from defrag import parse_block_path
+
+LOST_FOUND = "lost+found"
+ENTRIES_PER_TASK = 1000
+MAX_PROBLEM_SAMPLES = 100
+
+# Para que la memoria quede acotada con millones de bloques, los bloques
+# referenciados se vuelcan a disco repartidos en particiones por hash del nombre
+# y los huérfanos se buscan partición por partición.
+def _partition_of(block_name: str, partitions: int) -> int:
+    return zlib.crc32(block_name.encode("utf-8")) % partitions
+
+def walk_chain(name: str, entry: Dict) -> Tuple[List[Dict], List[str], Optional[str], int]:
+    # Devuelve (problemas, bloques válidos en orden, último bloque válido, bytes leídos)
+    problems = []
+    valid = []
+    seen = set()
+    size = 0
+    # Las entradas anteriores al almacenamiento por bytes solo registran caracteres
+    legacy = "total_bytes" not in entry
+    chars = 0
+    last_good = None
+    current = entry.get("ruta_datos_inicial")
+    while current:
+        if current in seen:
+            problems.append({"tipo": "ciclo", "archivo": name, "bloque": current,
+                             "detalle": f"El bloque {last_good} vuelve a {current}."})
+            break
+        seen.add(current)
+        if not os.path.exists(current):
+            tipo = "entrada_sin_datos" if last_good is None else "cadena_rota"
+            problems.append({"tipo": tipo, "archivo": name, "bloque": current,
+                             "detalle": "El bloque referenciado no existe."})
+            break
+        try:
+            block = read_block(current)
+            data = block["datos"]
+        except (OSError, ValueError, KeyError):
+            problems.append({"tipo": "bloque_ilegible", "archivo": name, "bloque": current,
+                             "detalle": "El bloque no se puede leer."})
+            break
+        expected = block.get("crc32")
+        if expected is not None and block_checksum(data) != expected:
+            problems.append({"tipo": "checksum", "archivo": name, "bloque": current,
+                             "detalle": f"crc32 esperado {expected}, calculado {block_checksum(data)}."})
+        valid.append(current)
+        last_good = current
+        size += len(data)
+        if legacy:
+            chars += len(data.decode(TEXT_ENCODING, "replace"))
+        if block.get("eof"):
+            break
+        current = block.get("siguiente")
+
+    expected_size = entry.get("total_caracteres") if legacy else entry["total_bytes"]
+    found_size = chars if legacy else size
+    if not problems and found_size != expected_size:
+        problems.append({"tipo": "tamano_incorrecto", "archivo": name, "bloque": None,
+                         "detalle": f"FAT dice {expected_size}, la cadena tiene {found_size}."})
+    return problems, valid, last_good, size
+
+def _check_entries(items: List[Tuple[str, Dict]], spill_dir: str, partitions: int) -> List[Dict]:
+    problems = []
+    spill = {}
+    try:
+        for name, entry in items:
+            entry_problems, valid, _, _ = walk_chain(name, entry)
+            problems.extend(entry_problems)
+            for block_path in valid:
+                block_name = os.path.basename(block_path)
+                p = _partition_of(block_name, partitions)
+                if p not in spill:
+                    spill[p] = open(os.path.join(spill_dir, f"ref_{p}_{os.getpid()}.txt"), 'a')
+                spill[p].write(block_name + "\n")
+    finally:
+        for f in spill.values():
+            f.close()
+    return problems
+
+def _find_orphans(partition: int, spill_dir: str, partitions: int) -> int:
+    referenced = set()
+    prefix = f"ref_{partition}_"
+    for spill_name in os.listdir(spill_dir):
+        if spill_name.startswith(prefix):
+            with open(os.path.join(spill_dir, spill_name), 'r') as f:
+                referenced.update(line.rstrip("\n") for line in f)
+
+    count = 0
+    with open(os.path.join(spill_dir, f"orphans_{partition}.txt"), 'w') as out, os.scandir(FS_DIR) as it:
+        for dir_entry in it:
+            if not parse_block_path(dir_entry.name):
+                continue
+            if _partition_of(dir_entry.name, partitions) != partition or dir_entry.name in referenced:
+                continue
+            out.write(dir_entry.name + "\n")
+            count += 1
+    return count
+
+def _chunks(items: Iterator, size: int) -> Iterator[List]:
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+def iter_orphans(spill_dir: str) -> Iterator[str]:
+    for spill_name in sorted(os.listdir(spill_dir)):
+        if spill_name.startswith("orphans_"):
+            with open(os.path.join(spill_dir, spill_name), 'r') as f:
+                for line in f:
+                    yield os.path.join(FS_DIR, line.rstrip("\n"))
+
+def _set_size(entry: Dict, size: int):
+    entry["total_bytes"] = size
+    encoding = entry.get("codificacion", TEXT_ENCODING)
+    if encoding is None:
+        entry["total_caracteres"] = size
+    else:
+        # Una cadena truncada puede cortar un carácter multibyte: se cuenta como reemplazo
+        entry["total_caracteres"] = len(read_file_bytes(entry["ruta_datos_inicial"]).decode(encoding, "replace"))
+
+def _truncate_chain(entry: Dict, last_good: Optional[str], size: int):
+    if last_good is None:
+        entry["ruta_datos_inicial"] = None
+    else:
+        block = read_block(last_good)
+        write_block(last_good, block["datos"], None, True, block.get("crc32"), replace=True)
+    _set_size(entry, size)
+
+def _rewrite_checksum(block_path: str):
+    block = read_block(block_path)
+    write_block(block_path, block["datos"], block.get("siguiente"), block.get("eof"), replace=True)
+
+def repair_entry(name: str, entry: Dict, problems: List[Dict]):
+    tipos = {problem["tipo"] for problem in problems}
+    if "checksum" in tipos:
+        # Los datos dañados no se pueden reconstruir: se aceptan tal cual para que el archivo vuelva a leerse
+        for problem in problems:
+            if problem["tipo"] == "checksum":
+                _rewrite_checksum(problem["bloque"])
+    _, _, last_good, size = walk_chain(name, entry)
+    if tipos & {"ciclo", "cadena_rota", "entrada_sin_datos", "bloque_ilegible"}:
+        _truncate_chain(entry, last_good, size)
+    else:
+        _set_size(entry, size)
+
+def _append_lost_found(controller: FileSystemController, orphans: Iterator[str]) -> int:
+    # Los datos huérfanos se encadenan en un archivo "lost+found" bloque a bloque,
+    # sin armar el contenido completo en memoria. Pueden venir de archivos binarios,
+    # así que lost+found se guarda como binario (read_file_bytes)
+    entry = controller.fat["files"].get(LOST_FOUND)
+    tail = None
+    index = 0
+    size = 0
+    if entry:
+        _, valid, tail, size = walk_chain(LOST_FOUND, entry)
+        indices = [parsed[1] for parsed in map(parse_block_path, valid) if parsed]
+        index = (max(indices) + 1) if indices else 0
+
+    recovered = 0
+    pending = None
+    for orphan in orphans:
+        try:
+            data = read_block(orphan)["datos"]
+        except (OSError, ValueError, KeyError):
+            continue
+        block_path = get_block_path(f"{LOST_FOUND}_{index}")
+        while os.path.exists(block_path):
+            index += 1
+            block_path = get_block_path(f"{LOST_FOUND}_{index}")
+        index += 1
+        write_block(block_path, data, None, True)
+        remove_block(orphan)
+        if pending or tail:
+            link_from = pending or tail
+            block = read_block(link_from)
+            write_block(link_from, block["datos"], block_path, False, block.get("crc32"), replace=True)
+        else:
+            if entry is None:
+                now = datetime.datetime.now().isoformat()
+                entry = compact_entry({
+                    "nombre": LOST_FOUND,
+                    "ruta_datos_inicial": None,
+                    "papelera": False,
+                    "total_caracteres": 0,
+                    "total_bytes": 0,
+                    "codificacion": None,
+                    "fecha_creacion": now,
+                    "fecha_modificacion": now,
+                    "fecha_eliminacion": None,
+                    "owner": "admin",
+                    "permissions": {}
+                })
+                controller.fat["files"][LOST_FOUND] = entry
+                controller.link_path(LOST_FOUND, "archivo")
+            entry["ruta_datos_inicial"] = block_path
+        pending = block_path
+        size += len(data)
+        recovered += 1
+
+    if recovered:
+        entry["total_caracteres"] = size
+        entry["total_bytes"] = size
+        entry["codificacion"] = None
+        entry["fecha_modificacion"] = datetime.datetime.now().isoformat()
+    return recovered
+
+def fsck(controller: FileSystemController, repair: bool = False, workers: Optional[int] = None,
+         partitions: int = 16) -> Dict:
+    workers = workers or os.cpu_count() or 1
+    spill_dir = tempfile.mkdtemp(prefix="fsck_")
+    try:
+        problems = []
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # Solo unas pocas tareas en vuelo a la vez para no duplicar la FAT en memoria
+            in_flight = []
+            max_in_flight = 2 * workers
+            for chunk in _chunks(iter(controller.fat["files"].items()), ENTRIES_PER_TASK):
+                in_flight.append(pool.submit(_check_entries, chunk, spill_dir, partitions))
+                if len(in_flight) >= max_in_flight:
+                    problems.extend(in_flight.pop(0).result())
+            for future in in_flight:
+                problems.extend(future.result())
+
+            orphan_count = sum(pool.map(_find_orphans, range(partitions),
+                                        [spill_dir] * partitions, [partitions] * partitions))
+
+        report = {"archivos_revisados": len(controller.fat["files"]), "bloques_huerfanos": orphan_count,
+                  "problemas": problems[:MAX_PROBLEM_SAMPLES], "total_problemas": len(problems) + orphan_count,
+                  "reparado": False, "recuperados_lost_found": 0}
+
+        if repair and (problems or orphan_count):
+            with controller.lock:
+                by_file: Dict[str, List[Dict]] = {}
+                for problem in problems:
+                    by_file.setdefault(problem["archivo"], []).append(problem)
+                for name, file_problems in by_file.items():
+                    repair_entry(name, controller.fat["files"][name], file_problems)
+                    # Los bloques reescritos ya no comparten inodo con las versiones
+                    controller.refresh_version_blocks(controller.fat["files"][name])
+                report["recuperados_lost_found"] = _append_lost_found(controller, iter_orphans(spill_dir))
+                controller.save_all()
+                # Las reparaciones cambian tamaños y agregan lost+found: se reconcilian los contadores
+                controller.audit_usage()
+            report["reparado"] = True
+        return report
+    finally:
+        shutil.rmtree(spill_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Verificación y reparación del volumen FAT")
+    parser.add_argument("--repair", action="store_true", help="Reparar cadenas y mover huérfanos a lost+found")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--partitions", type=int, default=16)
+    args = parser.parse_args()
+
+    report = fsck(FileSystemController(), repair=args.repair, workers=args.workers, partitions=args.partitions)
+    print(f"Archivos revisados: {report['archivos_revisados']}")
+    print(f"Bloques huérfanos: {report['bloques_huerfanos']}")
+    for problem in report["problemas"]:
+        print(f"[{problem['tipo']}] {problem['archivo']}: {problem['detalle']}")
+    if report["total_problemas"] > len(report["problemas"]) + report["bloques_huerfanos"]:
+        print(f"... {report['total_problemas']} problemas en total")
+    if report["reparado"]:
+        print(f"Reparado. Bloques movidos a {LOST_FOUND}: {report['recuperados_lost_found']}")
+
+if __name__ == "__main__":
+    main()
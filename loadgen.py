@@ -0,0 +1,452 @@
+"""Generador de carga multiusuario y reproducción de trazas sobre FileSystemController.
+
+Uso:
+    python loadgen.py generar [--users N] [--duration S] [--mix create=10,open=45,...]
+                              [--think-ms MS] [--size BYTES] [--size-sigma S] [--mode hilos|procesos]
+    python loadgen.py reproducir TRAZA.jsonl [--speed X] [--mode hilos|procesos]
+
+Cada usuario simulado es una sesión propia (su propio controlador, como otro proceso de
+la GUI). Para grabar una sesión real: FAT_TRACE=sesion.jsonl python main_app.py (o con
+python -m fat_cli); cada operación queda como una línea JSON con su hora, usuario y
+tamaño, sin el contenido. La reproducción conviene hacerla sobre un volumen nuevo o una
+copia: crea los usuarios de la traza con la contraseña "loadgen".
+"""
+import argparse
+import functools
+import json
+import math
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from main_logic import TEXT_ENCODING, FileSystemController
+
+OPERATIONS = ("create", "open", "modify", "delete", "recover", "list")
+DEFAULT_MIX = {"create": 10, "open": 45, "modify": 20, "delete": 5, "recover": 5, "list": 15}
+LOADGEN_PASSWORD = "loadgen"
+USER_PREFIX = "carga"
+TEXT_POOL_SIZE = 1 << 16
+
+# (instante desde el inicio en s, operación, latencia en s, error o None)
+Sample = Tuple[float, str, float, Optional[str]]
+
+def parse_mix(text: str) -> Dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        op, _, weight = part.partition("=")
+        if op not in OPERATIONS:
+            raise ValueError(f"Operación desconocida '{op}' (válidas: {', '.join(OPERATIONS)}).")
+        mix[op] = float(weight)
+    return mix
+
+def result_error(result) -> Optional[str]:
+    # Las operaciones devuelven "Éxito: ..."/"Error: ..." o un dict con "error"
+    if isinstance(result, str) and not result.startswith("Éxito"):
+        return result
+    if isinstance(result, dict) and "error" in result:
+        return result["error"]
+    return None
+
+# --- Grabación de sesiones ---
+
+class TraceRecorder:
+    """Envuelve los métodos públicos de un controlador y agrega una línea por operación."""
+
+    def __init__(self, controller: FileSystemController, path: str):
+        self.controller = controller
+        self._file = open(path, 'a')
+        self._lock = threading.Lock()
+        size = lambda content: len(content.encode(TEXT_ENCODING))
+        self._wrap("create_file", "create", lambda name, content: {"nombre": name, "tamano": size(content)})
+        self._wrap("modify_file", "modify", lambda name, content: {"nombre": name, "tamano": size(content)})
+        self._wrap("open_file", "open", lambda name: {"nombre": name})
+        self._wrap("delete_file", "delete", lambda name: {"nombre": name})
+        self._wrap("recover_file", "recover", lambda name: {"nombre": name})
+        self._wrap("get_list_files", "list", lambda is_trash=False: {"papelera": is_trash})
+        self._wrap("list_file_names", "list", lambda is_trash=False: {"papelera": is_trash})
+        self._wrap("manage_permissions", "perms", lambda name, target_user, perm_type, add:
+                   {"nombre": name, "destino": target_user, "permiso": perm_type, "agregar": add})
+
+    def _wrap(self, method_name: str, op: str, describe: Callable[..., Dict]):
+        original = getattr(self.controller, method_name)
+
+        @functools.wraps(original)
+        def recorded(*args, **kwargs):
+            # Hora absoluta: varias sesiones (GUIs, invocaciones del CLI) pueden agregar a la misma traza
+            start = time.time()
+            result = original(*args, **kwargs)
+            record = {"t": round(start, 6), "usuario": self.controller.current_user, "op": op,
+                      **describe(*args, **kwargs), "error": result_error(result) is not None}
+            with self._lock:
+                self._file.write(json.dumps(record) + "\n")
+                self._file.flush()
+            return result
+
+        setattr(self.controller, method_name, recorded)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+def record_session(controller: FileSystemController, path: str) -> TraceRecorder:
+    return TraceRecorder(controller, path)
+
+def load_trace(path: str) -> List[Dict]:
+    # Tiempos relativos al primer evento
+    with open(path, 'r') as f:
+        trace = sorted((json.loads(line) for line in f if line.strip()), key=lambda event: event["t"])
+    start = trace[0]["t"] if trace else 0.0
+    for event in trace:
+        event["t"] -= start
+    return trace
+
+# --- Contenido y distribuciones ---
+
+_text_pool: Optional[str] = None
+
+def _content(rng: random.Random, size: int) -> str:
+    # Un tramo de un texto aleatorio fijo: generar cada contenido carácter a carácter dominaría la medición
+    global _text_pool
+    if _text_pool is None:
+        pool_rng = random.Random(0)
+        _text_pool = "".join(pool_rng.choice("abcdefghijklmnopqrstuvwxyz ") for _ in range(TEXT_POOL_SIZE))
+    text = _text_pool * (size // TEXT_POOL_SIZE + 2)
+    start = rng.randrange(TEXT_POOL_SIZE)
+    return text[start:start + size]
+
+def _sample_size(rng: random.Random, median: int, sigma: float) -> int:
+    # Log-normal: la mayoría de los archivos chicos y una cola de archivos grandes
+    if sigma <= 0:
+        return max(1, median)
+    return max(1, int(rng.lognormvariate(math.log(max(1, median)), sigma)))
+
+def _think(rng: random.Random, think_ms: float):
+    if think_ms > 0:
+        time.sleep(rng.expovariate(1000.0 / think_ms))
+
+def _login(user: str, password: str = LOADGEN_PASSWORD) -> FileSystemController:
+    controller = FileSystemController()
+    if not controller.authenticate(user, password):
+        raise RuntimeError(f"No se pudo iniciar sesión como '{user}'.")
+    return controller
+
+def _admin_controller(admin_user: str, admin_password: str) -> FileSystemController:
+    controller = FileSystemController()
+    if not controller.get_admin_status():
+        controller.register_admin(admin_user, admin_password)
+    if not controller.authenticate(admin_user, admin_password):
+        raise RuntimeError("Credenciales de admin incorrectas (--admin / --admin-password).")
+    return controller
+
+def _ensure_users(admin: FileSystemController, users: List[str]):
+    for user in users:
+        if user not in admin.users:
+            error = result_error(admin.add_user(user, LOADGEN_PASSWORD, "user"))
+            if error:
+                raise RuntimeError(error)
+    admin.flush()
+
+# --- Carga generada ---
+
+def setup_workload(users: int, files_per_user: int, size: int, sigma: float, share_ratio: float, seed: int,
+                   admin_user: str = "admin", admin_password: str = "admin") -> Dict[str, Dict[str, List[str]]]:
+    # Usuarios con add_user, archivos iniciales y permisos cruzados con manage_permissions
+    rng = random.Random(seed)
+    names = [f"{USER_PREFIX}{i}" for i in range(users)]
+    admin = _admin_controller(admin_user, admin_password)
+    _ensure_users(admin, names)
+    admin.shutdown()
+
+    plan = {user: {"propios": [], "lectura": [], "escritura": []} for user in names}
+    for user in names:
+        controller = _login(user)
+        for i in range(files_per_user):
+            name = f"{user}_inicial{i}"
+            if result_error(controller.create_file(name, _content(rng, _sample_size(rng, size, sigma)))):
+                continue
+            plan[user]["propios"].append(name)
+            others = [other for other in names if other != user]
+            if others and rng.random() < share_ratio:
+                target = rng.choice(others)
+                controller.manage_permissions(name, target, "lectura", True)
+                plan[target]["lectura"].append(name)
+                if rng.random() < 0.5:
+                    controller.manage_permissions(name, target, "escritura", True)
+                    plan[target]["escritura"].append(name)
+        controller.shutdown()
+    return plan
+
+def run_generated_user(user: str, files: Dict[str, List[str]], mix: Dict[str, float], duration: float,
+                       think_ms: float, size: int, sigma: float, seed: int, start_at: float,
+                       sync: bool = False) -> List[Sample]:
+    # Una sesión simulada; start_at (time.time()) alinea el eje de tiempo entre procesos
+    rng = random.Random(seed)
+    controller = _login(user)
+    own = list(files["propios"])
+    trash: List[str] = []
+    readable = own + files["lectura"]
+    writable = own + files["escritura"]
+    ops = list(mix)
+    weights = [mix[op] for op in ops]
+    created = 0
+    samples: List[Sample] = []
+    try:
+        while time.time() - start_at < duration:
+            op = rng.choices(ops, weights)[0]
+            if (op == "open" and not readable) or (op == "modify" and not writable) \
+                    or (op == "delete" and not own) or (op == "recover" and not trash):
+                op = "create"
+            name = None
+            begin = time.perf_counter()
+            try:
+                if op == "create":
+                    name = f"{user}_n{seed}_{created}"
+                    created += 1
+                    result = controller.create_file(name, _content(rng, _sample_size(rng, size, sigma)))
+                elif op == "open":
+                    result = controller.open_file(rng.choice(readable))
+                elif op == "modify":
+                    result = controller.modify_file(rng.choice(writable), _content(rng, _sample_size(rng, size, sigma)))
+                elif op == "delete":
+                    name = rng.choice(own)
+                    result = controller.delete_file(name)
+                elif op == "recover":
+                    name = rng.choice(trash)
+                    result = controller.recover_file(name)
+                else:
+                    result = controller.get_list_files()
+                if sync:
+                    controller.flush()
+                error = result_error(result)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            samples.append((time.time() - start_at, op, time.perf_counter() - begin, error))
+            if error is None and name is not None:
+                if op == "create":
+                    own.append(name)
+                    readable.append(name)
+                    writable.append(name)
+                elif op == "delete":
+                    own.remove(name)
+                    trash.append(name)
+                elif op == "recover":
+                    trash.remove(name)
+                    own.append(name)
+            _think(rng, think_ms)
+    finally:
+        controller.shutdown()
+    return samples
+
+# --- Reproducción de trazas ---
+
+def setup_replay(trace: List[Dict], size: int, admin_user: str = "admin", admin_password: str = "admin"):
+    # Usuarios de la traza y archivos que ya existían antes de la sesión grabada: se crean con
+    # el tamaño visto y con permisos para quienes los usan
+    users = sorted({event["usuario"] for event in trace if event.get("usuario")})
+    admin = _admin_controller(admin_user, admin_password)
+    _ensure_users(admin, [user for user in users if user != admin_user])
+    admin.shutdown()
+
+    created = set()
+    preexisting: Dict[str, Dict] = {}
+    for event in trace:
+        name = event.get("nombre")
+        if not name or not event.get("usuario"):
+            continue
+        if event["op"] == "create":
+            created.add(name)
+        elif name not in created:
+            seed = preexisting.setdefault(name, {"owner": event["usuario"], "tamano": event.get("tamano") or size,
+                                                 "lectura": set(), "escritura": set()})
+            if event["usuario"] != seed["owner"]:
+                seed["escritura" if event["op"] == "modify" else "lectura"].add(event["usuario"])
+
+    rng = random.Random(0)
+    by_owner: Dict[str, List[Tuple[str, Dict]]] = {}
+    for name, seed in preexisting.items():
+        by_owner.setdefault(seed["owner"], []).append((name, seed))
+    for owner, seeds in by_owner.items():
+        controller = _login(owner, admin_password if owner == admin_user else LOADGEN_PASSWORD)
+        for name, seed in seeds:
+            controller.create_file(name, _content(rng, seed["tamano"]))
+            for user in seed["lectura"] | seed["escritura"]:
+                controller.manage_permissions(name, user, "lectura", True)
+            for user in seed["escritura"]:
+                controller.manage_permissions(name, user, "escritura", True)
+        controller.shutdown()
+
+def run_replay_user(user: str, password: str, events: List[Dict], speed: float, size: int,
+                    start_at: float, sync: bool = False) -> List[Sample]:
+    # speed = 1 respeta los tiempos grabados, 2 los acelera al doble, 0 sin esperas
+    rng = random.Random(user)
+    controller = _login(user, password)
+    samples: List[Sample] = []
+    try:
+        for event in events:
+            if speed > 0:
+                delay = start_at + event["t"] / speed - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+            op = event["op"]
+            begin = time.perf_counter()
+            try:
+                if op == "create":
+                    result = controller.create_file(event["nombre"], _content(rng, event.get("tamano") or size))
+                elif op == "modify":
+                    result = controller.modify_file(event["nombre"], _content(rng, event.get("tamano") or size))
+                elif op == "open":
+                    result = controller.open_file(event["nombre"])
+                elif op == "delete":
+                    result = controller.delete_file(event["nombre"])
+                elif op == "recover":
+                    result = controller.recover_file(event["nombre"])
+                elif op == "perms":
+                    result = controller.manage_permissions(event["nombre"], event["destino"], event["permiso"],
+                                                           event["agregar"])
+                else:
+                    result = controller.get_list_files(is_trash=event.get("papelera", False))
+                if sync:
+                    controller.flush()
+                error = result_error(result)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+            samples.append((time.time() - start_at, op, time.perf_counter() - begin, error))
+    finally:
+        controller.shutdown()
+    return samples
+
+# --- Ejecución y reporte ---
+
+def run_sessions(target: Callable[..., List[Sample]], jobs: List[tuple], mode: str) -> List[Sample]:
+    # Hilos: sesiones en el mismo proceso (comparten el GIL). Procesos: como varias GUIs abiertas
+    executor = ProcessPoolExecutor if mode == "procesos" else ThreadPoolExecutor
+    samples: List[Sample] = []
+    with executor(max_workers=max(1, len(jobs))) as pool:
+        for result in [pool.submit(target, *job) for job in jobs]:
+            samples.extend(result.result())
+    return samples
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, math.ceil(fraction * len(sorted_values)) - 1))]
+
+def _latency_summary(latencies: List[float]) -> Dict[str, float]:
+    latencies = sorted(latencies)
+    return {"p50_ms": percentile(latencies, 0.50) * 1000, "p95_ms": percentile(latencies, 0.95) * 1000,
+            "p99_ms": percentile(latencies, 0.99) * 1000, "max_ms": (latencies[-1] * 1000) if latencies else 0.0}
+
+def summarize(samples: List[Sample], interval: float = 1.0) -> Dict:
+    duration = max((t for t, _, _, _ in samples), default=0.0)
+    by_op: Dict[str, Dict] = {}
+    for op in sorted({op for _, op, _, _ in samples}):
+        op_samples = [s for s in samples if s[1] == op]
+        errors = sum(1 for s in op_samples if s[3] is not None)
+        by_op[op] = {"operaciones": len(op_samples), "errores": errors,
+                     **_latency_summary([s[2] for s in op_samples])}
+
+    buckets: Dict[int, List[Sample]] = {}
+    for sample in samples:
+        buckets.setdefault(int(sample[0] // interval), []).append(sample)
+    timeline = []
+    for bucket in sorted(buckets):
+        bucket_samples = buckets[bucket]
+        errors = sum(1 for s in bucket_samples if s[3] is not None)
+        timeline.append({"desde_s": bucket * interval, "ops_por_s": len(bucket_samples) / interval,
+                         "tasa_error": errors / len(bucket_samples),
+                         "p95_ms": _latency_summary([s[2] for s in bucket_samples])["p95_ms"]})
+
+    error_counts: Dict[str, int] = {}
+    for _, _, _, error in samples:
+        if error is not None:
+            error_counts[error] = error_counts.get(error, 0) + 1
+    total_errors = sum(error_counts.values())
+    return {
+        "operaciones": len(samples),
+        "duracion_s": duration,
+        "ops_por_s": len(samples) / duration if duration else 0.0,
+        "tasa_error": total_errors / len(samples) if samples else 0.0,
+        "latencia": _latency_summary([s[2] for s in samples]),
+        "por_operacion": by_op,
+        "en_el_tiempo": timeline,
+        "errores_frecuentes": sorted(error_counts.items(), key=lambda item: -item[1])[:10],
+    }
+
+def print_report(report: Dict):
+    latency = report["latencia"]
+    print(f"Operaciones: {report['operaciones']}  duración: {report['duracion_s']:.1f}s  "
+          f"throughput: {report['ops_por_s']:.1f} ops/s  errores: {report['tasa_error']:.1%}")
+    print(f"Latencia total: p50 {latency['p50_ms']:.2f}ms  p95 {latency['p95_ms']:.2f}ms  "
+          f"p99 {latency['p99_ms']:.2f}ms  máx {latency['max_ms']:.2f}ms")
+    print(f"\n{'operación':10} {'cantidad':>9} {'errores':>8} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for op, stats in report["por_operacion"].items():
+        print(f"{op:10} {stats['operaciones']:>9} {stats['errores']:>8} {stats['p50_ms']:>7.2f}ms "
+              f"{stats['p95_ms']:>7.2f}ms {stats['p99_ms']:>7.2f}ms")
+    print(f"\n{'desde':>7} {'ops/s':>9} {'errores':>8} {'p95':>9}")
+    for row in report["en_el_tiempo"]:
+        print(f"{row['desde_s']:>6.0f}s {row['ops_por_s']:>9.1f} {row['tasa_error']:>8.1%} {row['p95_ms']:>7.2f}ms")
+    if report["errores_frecuentes"]:
+        print("\nErrores más frecuentes:")
+        for error, count in report["errores_frecuentes"]:
+            print(f"  {count:>6}  {error}")
+
+def main():
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--admin", default="admin")
+    common.add_argument("--admin-password", default="admin")
+    common.add_argument("--mode", choices=["hilos", "procesos"], default="hilos")
+    common.add_argument("--size", type=int, default=500, help="Tamaño mediano del contenido en bytes")
+    common.add_argument("--interval", type=float, default=1.0, help="Ancho de los intervalos del reporte en s")
+    common.add_argument("--report", help="Guardar el reporte completo como JSON")
+    common.add_argument("--sync", action="store_true",
+                        help="Flush después de cada operación (como sesiones cortas del CLI); sin esto "
+                             "los cambios de una sesión llegan a las demás con el write-back")
+    parser = argparse.ArgumentParser(description="Generador de carga y reproducción de trazas del simulador FAT")
+    sub = parser.add_subparsers(dest="accion", required=True)
+
+    gen = sub.add_parser("generar", parents=[common], help="Carga sintética con una mezcla de operaciones")
+    gen.add_argument("--users", type=int, default=8)
+    gen.add_argument("--duration", type=float, default=10.0)
+    gen.add_argument("--mix", type=parse_mix, default=DEFAULT_MIX,
+                     help="Pesos por operación, p. ej. create=10,open=45,modify=20,delete=5,recover=5,list=15")
+    gen.add_argument("--think-ms", type=float, default=20.0, help="Pausa media entre operaciones (exponencial)")
+    gen.add_argument("--size-sigma", type=float, default=1.0, help="Dispersión log-normal del tamaño")
+    gen.add_argument("--files-per-user", type=int, default=10)
+    gen.add_argument("--share", type=float, default=0.3, help="Fracción de archivos compartidos con otro usuario")
+    gen.add_argument("--seed", type=int, default=1)
+
+    rep = sub.add_parser("reproducir", parents=[common], help="Reproduce una traza grabada con FAT_TRACE")
+    rep.add_argument("traza")
+    rep.add_argument("--speed", type=float, default=1.0,
+                     help="1 = tiempos grabados, 0 = sin esperas (sin orden entre usuarios)")
+    args = parser.parse_args()
+
+    if args.accion == "generar":
+        plan = setup_workload(args.users, args.files_per_user, args.size, args.size_sigma, args.share, args.seed,
+                              args.admin, args.admin_password)
+        start_at = time.time()
+        jobs = [(user, files, args.mix, args.duration, args.think_ms, args.size, args.size_sigma,
+                 args.seed * 1000 + i, start_at, args.sync) for i, (user, files) in enumerate(plan.items())]
+        samples = run_sessions(run_generated_user, jobs, args.mode)
+    else:
+        trace = load_trace(args.traza)
+        setup_replay(trace, args.size, args.admin, args.admin_password)
+        by_user: Dict[str, List[Dict]] = {}
+        for event in trace:
+            if event.get("usuario"):
+                by_user.setdefault(event["usuario"], []).append(event)
+        start_at = time.time()
+        jobs = [(user, args.admin_password if user == args.admin else LOADGEN_PASSWORD, events, args.speed,
+                 args.size, start_at, args.sync) for user, events in by_user.items()]
+        samples = run_sessions(run_replay_user, jobs, args.mode)
+
+    report = summarize(samples, args.interval)
+    print_report(report)
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=4)
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,25 @@
+import os
 import sys
-from PyQt5.QtWidgets import QApplication, QMessageBox, QLineEdit, QListWidget, QLabel
+from PyQt5.QtWidgets import QApplication, QMessageBox, QLineEdit, QListWidget, QListWidgetItem, QLabel
 from PyQt5.QtCore import Qt
-from main_logic import FileSystemController 
+from main_logic import USAGE_AUDIT_INTERVAL, FileSystemController 
 from ui_widgets import AuthWindow, MainWindow 
 
 class MainApplication:
     def __init__(self):
         self.app = QApplication(sys.argv)
         self.controller = FileSystemController()
+        if os.environ.get("FAT_TRACE"):
+            # Grabación de la sesión para python loadgen.py reproducir
+            from loadgen import record_session
+            record_session(self.controller, os.environ["FAT_TRACE"])
+        self.app.aboutToQuit.connect(self.controller.shutdown)
+        # Los contadores de uso se reconcilian con la FAT al arrancar y cada USAGE_AUDIT_INTERVAL
+        self.controller.start_usage_audit(USAGE_AUDIT_INTERVAL)
+        if os.environ.get("FAT_MIRROR"):
+            # Replicación al espejo; se detiene después del shutdown del controlador
+            from replication import start_mirror
+            self.app.aboutToQuit.connect(start_mirror(os.environ["FAT_MIRROR"]).stop)
         self.auth_window = None
         self.main_window = None
 
@@ -65,6 +77,12 @@ class MainApplication:
         except (TypeError, RuntimeError): pass
         try: self.main_window.btn_modify.clicked.disconnect()
         except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_set_retention.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_view_version.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_restore_version.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
         try: self.main_window.btn_delete.clicked.disconnect()
         except (TypeError, RuntimeError): pass
         try: self.main_window.btn_recover.clicked.disconnect()
@@ -73,6 +91,14 @@ class MainApplication:
         except (TypeError, RuntimeError): pass
         try: self.main_window.btn_apply_perm.clicked.disconnect()
         except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_set_quota.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_set_capacity.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
+        try: self.main_window.btn_search.clicked.disconnect()
+        except (TypeError, RuntimeError): pass
+        try: self.main_window.search_input.returnPressed.disconnect()
+        except (TypeError, RuntimeError): pass
 
         current_block = self.main_window.stacked_content.widget(index)
         
@@ -95,6 +121,9 @@ class MainApplication:
         elif "5. Modificar Archivo" in page_title:
             self.main_window.btn_load_content.clicked.connect(self._handle_load_content_for_modify)
             self.main_window.btn_modify.clicked.connect(self._handle_modify_file)
+            self.main_window.btn_set_retention.clicked.connect(self._handle_set_retention)
+            self.main_window.btn_view_version.clicked.connect(self._handle_view_version)
+            self.main_window.btn_restore_version.clicked.connect(self._handle_restore_version)
 
         elif "6. Mover a Papelera" in page_title:
             self.main_window.btn_delete.clicked.connect(self._handle_delete_file)
@@ -106,15 +135,21 @@ class MainApplication:
         elif "8. Gestión de Usuarios" in page_title:
             self._refresh_user_list()
             self.main_window.btn_add_user.clicked.connect(self._handle_add_user)
+            self.main_window.btn_set_quota.clicked.connect(self._handle_set_quota)
+            self.main_window.btn_set_capacity.clicked.connect(self._handle_set_capacity)
             
         elif "9. Gestión de Permisos" in page_title:
             self.main_window.btn_apply_perm.clicked.connect(self._handle_manage_perms)
+
+        elif "10. Buscar en Contenido" in page_title:
+            self.main_window.btn_search.clicked.connect(self._handle_search)
+            self.main_window.search_input.returnPressed.connect(self._handle_search)
             
     def _handle_logout(self):
-        self.controller.save_all()
+        # shutdown() escribe los metadatos pendientes del write-back
+        self.controller.shutdown()
         self.main_window.close()
-        self.controller.current_user = None
-        self.controller.user_role = None
+        self.controller.logout()
         # Vuelve a iniciar la autenticación en el mismo proceso
         self.start_auth()
 
@@ -175,6 +210,7 @@ class MainApplication:
             QMessageBox.critical(self.main_window, "Error de Carga", result['error'])
         else:
             self.main_window.modify_content_input.setText(result['content'])
+        self._refresh_version_history()
 
 
     def _handle_modify_file(self):
@@ -188,6 +224,63 @@ class MainApplication:
         else:
             QMessageBox.critical(self.main_window, "Error al Modificar", result)
 
+    def _refresh_version_history(self):
+        name = self.main_window.modify_name_input.text().strip()
+        self.main_window.version_list.clear()
+        result = self.controller.list_versions(name)
+        if "error" in result:
+            return
+        self.main_window.version_retention_input.setText(str(result["max_versiones"]))
+        for version in reversed(result["versiones"]):
+            label = " (actual)" if version["actual"] else ""
+            item = QListWidgetItem(f"v{version['version']}{label} | {version['fecha_modificacion']} | "
+                                   f"{version['total_caracteres']} chars", self.main_window.version_list)
+            item.setData(Qt.UserRole, version["version"])
+
+    def _selected_version(self):
+        item = self.main_window.version_list.currentItem()
+        if item is None:
+            QMessageBox.critical(self.main_window, "Historial", "Seleccione una versión.")
+            return None
+        return item.data(Qt.UserRole)
+
+    def _handle_set_retention(self):
+        name = self.main_window.modify_name_input.text().strip()
+        value = self.main_window.version_retention_input.text().strip()
+        if not value.isdigit():
+            QMessageBox.critical(self.main_window, "Historial", "La cantidad de versiones debe ser un número entero.")
+            return
+        result = self.controller.set_version_retention(name, int(value))
+        if result.startswith("Éxito"):
+            QMessageBox.information(self.main_window, "Historial", result)
+            self._refresh_version_history()
+        else:
+            QMessageBox.critical(self.main_window, "Historial", result)
+
+    def _handle_view_version(self):
+        version = self._selected_version()
+        if version is None:
+            return
+        # El contenido de la versión queda en el editor: guardarlo equivale a restaurarla con cambios
+        result = self.controller.read_version(self.main_window.modify_name_input.text().strip(), version)
+        if "error" in result:
+            QMessageBox.critical(self.main_window, "Historial", result["error"])
+        else:
+            self.main_window.modify_content_input.setText(result["content"])
+
+    def _handle_restore_version(self):
+        version = self._selected_version()
+        if version is None:
+            return
+        name = self.main_window.modify_name_input.text().strip()
+        result = self.controller.restore_version(name, version)
+        if result.startswith("Éxito"):
+            QMessageBox.information(self.main_window, "Historial", result)
+            self.main_window.modify_content_input.setText(self.controller.open_file(name).get("content", ""))
+            self._refresh_version_history()
+        else:
+            QMessageBox.critical(self.main_window, "Historial", result)
+
     def _handle_delete_file(self):
         name = self.main_window.delete_name_input.text().strip()
         result = self.controller.delete_file(name)
@@ -237,12 +330,66 @@ class MainApplication:
         else:
             QMessageBox.critical(self.main_window, "Error de Permiso", result)
             
+    def _handle_search(self):
+        query = self.main_window.search_input.text().strip()
+        self.main_window.search_results.clear()
+        if not query:
+            return
+
+        results = self.controller.search(query)
+        if not results:
+            self.main_window.search_results.addItem(f"Sin resultados para '{query}'.")
+        for result in results:
+            self.main_window.search_results.addItem(f"{result['name']} ({result['coincidencias']} coincidencias)")
+
+    def _handle_set_quota(self):
+        username = self.main_window.quota_user_input.text().strip()
+        value = self.main_window.quota_value_input.text().strip()
+        if value and not value.isdigit():
+            QMessageBox.critical(self.main_window, "Error de Cuota", "La cuota debe ser un número entero.")
+            return
+        result = self.controller.set_quota(username, int(value) if value else None)
+
+        if result.startswith("Éxito"):
+            QMessageBox.information(self.main_window, "Cuota Asignada", result)
+            self._refresh_user_list()
+        else:
+            QMessageBox.critical(self.main_window, "Error de Cuota", result)
+
+    def _handle_set_capacity(self):
+        value = self.main_window.capacity_value_input.text().strip()
+        if value and not value.isdigit():
+            QMessageBox.critical(self.main_window, "Error de Capacidad", "La capacidad debe ser un número entero.")
+            return
+        result = self.controller.set_volume_capacity(int(value) if value else None)
+
+        if result.startswith("Éxito"):
+            QMessageBox.information(self.main_window, "Capacidad Asignada", result)
+            self._refresh_user_list()
+        else:
+            QMessageBox.critical(self.main_window, "Error de Capacidad", result)
+
     def _refresh_user_list(self):
         self.main_window.user_list.clear()
+        self.main_window.usage_list.clear()
         
         if self.controller.is_admin():
             for user, data in self.controller.users.items():
                 self.main_window.user_list.addItem(f"{user} (Rol: {data['role']})")
+
+            usage = self.controller.get_usage()
+            volume = usage["volumen"]
+            free = ("sin límite" if volume["bloques_libres"] is None
+                    else f"{volume['bloques_libres']} libres de {volume['capacidad_bloques']}")
+            self.main_window.usage_list.addItem(
+                f"Volumen: {volume['archivos']} archivos | {volume['caracteres']} chars | "
+                f"papelera {volume['papelera_caracteres']} chars | {volume['bloques']} bloques ({free})")
+            for user, counters in sorted(usage["usuarios"].items()):
+                quota = counters["cuota_caracteres"]
+                self.main_window.usage_list.addItem(
+                    f"{user}: {counters['archivos']} archivos | {counters['caracteres']} chars | "
+                    f"papelera {counters['papelera_caracteres']} chars | {counters['bloques']} bloques | "
+                    f"cuota {quota if quota is not None else 'sin límite'}")
     
 if __name__ == "__main__":
     MainApplication().start_auth()
\ No newline at end of file
@@ -1,25 +1,263 @@
+import atexit
 import json
 import os
 import datetime
-from typing import Dict, List, Optional
+import shutil
+import sys
+import functools
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Tuple, Union
+
+from auth import SessionStore, hash_password, needs_rehash, verified_cache, verify_password, verify_unknown_user
+from fat_compact import CompactEntry, compact_entry, load_compact_fat, to_json
+
+# fat_binary, fat_shards, readahead y search_index se importan al usarse: cada import
+# suma al arranque de cada comando de fat_cli
+if TYPE_CHECKING:
+    from readahead import ChainPrefetch, ReadAhead
+    from search_index import IndexWorker
 
 FS_DIR = "filesystem"
 FAT_FILE = os.path.join(FS_DIR, "fat_table.json")
+FAT_BIN_FILE = os.path.join(FS_DIR, "fat_table.bin")
+FAT_SHARDS_DIR = os.path.join(FS_DIR, "fat_shards")
 USERS_FILE = os.path.join(FS_DIR, "users.json") 
+SEARCH_INDEX_DIR = os.path.join(FS_DIR, "search_index")
+USAGE_FILE = os.path.join(FS_DIR, "usage.json")
+DIRS_FILE = os.path.join(FS_DIR, "directories.json")
+SESSIONS_FILE = os.path.join(FS_DIR, "sessions.json")
+ROOT_DIR = ""
+DENTRY_CACHE_SIZE = 4096
+# Write-back de metadatos: un cambio queda en memoria a lo sumo FLUSH_INTERVAL segundos,
+# o hasta juntar FLUSH_MAX_DIRTY entradas sucias
+FLUSH_INTERVAL = 2.0
+FLUSH_MAX_DIRTY = 256
+# Auditoría periódica de los contadores de uso en sesiones largas (GUI)
+USAGE_AUDIT_INTERVAL = 300.0
 BLOCK_PREFIX = "block_"
-BLOCK_SIZE = 20 
+# Bloques de versiones anteriores: fuera del patrón block_ que recorren fsck y el desfragmentador
+VERSION_BLOCK_PREFIX = "vblock_"
+BLOCK_EXT = ".blk"
+LEGACY_BLOCK_EXT = ".json"
+BLOCK_SIZE = 20  # bytes por bloque
+TEXT_ENCODING = "utf-8"
+# Cabecera de un bloque: magia, flags (bit 0 = eof), crc32, bytes de datos, bytes de la ruta siguiente.
+# Después van la ruta siguiente (utf-8) y los datos crudos.
+BLOCK_HEADER = struct.Struct("<4sBIHH")
+BLOCK_MAGIC = b"FATB"
+
+class BlockCorruptionError(Exception):
+    pass
+
+def ensure_fs_dir():
+    # Se crea al escribir, no al importar: el CLI no debe tocar el disco solo por cargar el módulo
+    os.makedirs(FS_DIR, exist_ok=True)
+
+# Replicación (replication.py): recibe cada ruta del volumen que se escribe o se borra
+_change_listeners: List[Callable[[str], None]] = []
+
+def add_change_listener(listener: Callable[[str], None]):
+    _change_listeners.append(listener)
+
+def remove_change_listener(listener: Callable[[str], None]):
+    _change_listeners.remove(listener)
+
+def notify_change(path: str):
+    for listener in _change_listeners:
+        listener(path)
+
+def remove_block(block_path: str):
+    os.remove(block_path)
+    notify_change(block_path)
+
+def write_json(path: str, data: Dict, **kwargs):
+    # Archivo temporal + os.replace: otra sesión nunca lee un JSON a medio escribir
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=4, **kwargs)
+    os.replace(tmp_path, path)
+    notify_change(path)
+
+def get_block_path(block_id: str) -> str:
+    return os.path.join(FS_DIR, f"{BLOCK_PREFIX}{block_id}{BLOCK_EXT}")
+
+def get_version_block_path(block_path: str, file_name: str, version: int, index: int) -> str:
+    # vblock_<nombre>_<versión>_<índice>, con la extensión del bloque original (.blk o .json)
+    ext = os.path.splitext(block_path)[1]
+    return os.path.join(FS_DIR, f"{VERSION_BLOCK_PREFIX}{block_base(file_name)}_{version}_{index}{ext}")
+
+def block_base(file_name: str) -> str:
+    # Los archivos viven en rutas "dir/sub/nombre"; la "/" no puede ir en el nombre del bloque
+    return file_name.replace("%", "%25").replace("/", "%2F")
+
+def normalize_path(path: str) -> Optional[str]:
+    parts = [part for part in path.strip().split("/") if part]
+    if any(part in (".", "..") for part in parts):
+        return None
+    return "/".join(parts)
+
+def new_directory(owner: Optional[str]) -> Dict:
+    return {"owner": owner, "fecha_creacion": datetime.datetime.now().isoformat(), "hijos": {}}
+
+def build_directories(fat: Dict) -> Dict:
+    # Volúmenes planos (o sin directories.json): todo cuelga de la raíz y los nombres
+    # con "/" generan sus directorios intermedios
+    dirs = {ROOT_DIR: new_directory(None)}
+    for name in fat["files"]:
+        parent, _, child = name.rpartition("/")
+        ancestor = ROOT_DIR
+        for part in (parent.split("/") if parent else []):
+            path = f"{ancestor}/{part}" if ancestor else part
+            if path not in dirs:
+                dirs[path] = new_directory(None)
+                dirs[ancestor]["hijos"][part] = "directorio"
+            ancestor = path
+        dirs[parent]["hijos"][child] = "archivo"
+    return dirs
+
+def file_stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def volume_stamp() -> Tuple:
+    # Generación del volumen en disco: cambia cuando cualquier proceso reescribe los metadatos.
+    # Los shards de una FAT particionada se revalidan aparte (ShardedFat.refresh), solo los cargados
+    shards_meta = os.path.join(FAT_SHARDS_DIR, "meta.json")   # fat_shards.META_FILE
+    return tuple(file_stamp(path) for path in (FAT_FILE, FAT_BIN_FILE, shards_meta, USERS_FILE, USAGE_FILE, DIRS_FILE))
+
+def load_directories() -> Optional[Dict]:
+    if os.path.exists(DIRS_FILE):
+        with open(DIRS_FILE, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_directories(dirs: Dict):
+    ensure_fs_dir()
+    write_json(DIRS_FILE, dirs)
+
+def block_checksum(data: Union[str, bytes, memoryview]) -> int:
+    if isinstance(data, str):
+        data = data.encode(TEXT_ENCODING)
+    return zlib.crc32(data)
+
+def verify_block(block: Dict, block_path: str):
+    # Los bloques creados antes de los checksums no traen "crc32" y no se verifican
+    expected = block.get("crc32")
+    if expected is not None and block_checksum(block["datos"]) != expected:
+        raise BlockCorruptionError(f"Checksum inválido en {block_path}.")
+
+def write_block(block_path: str, data: Union[bytes, memoryview], next_block_path: Optional[str], eof: bool,
+                crc32: Optional[int] = None, replace: bool = False):
+    # crc32 se pasa al copiar un bloque existente, para no ocultar datos ya dañados.
+    # replace: un bloque existente puede estar enlazado desde una versión (vblock_); en lugar de
+    # truncar ese inodo se escribe un archivo nuevo y se lo renombra encima
+    target = f"{block_path}.{os.getpid()}.{threading.get_ident()}.tmp" if replace else block_path
+    if block_path.endswith(LEGACY_BLOCK_EXT):
+        # Bloque JSON de un volumen anterior (p. ej. reparado por fsck)
+        block = {"datos": bytes(data).decode(TEXT_ENCODING), "siguiente": next_block_path, "eof": eof,
+                 "crc32": block_checksum(data) if crc32 is None else crc32}
+        with open(target, 'w') as f:
+            json.dump(block, f, indent=4)
+    else:
+        next_bytes = next_block_path.encode(TEXT_ENCODING) if next_block_path else b""
+        header = BLOCK_HEADER.pack(BLOCK_MAGIC, 1 if eof else 0,
+                                   block_checksum(data) if crc32 is None else crc32, len(data), len(next_bytes))
+        with open(target, 'wb') as f:
+            f.write(header + next_bytes)
+            f.write(data)
+    if replace:
+        os.replace(target, block_path)
+    notify_change(block_path)
 
-os.makedirs(FS_DIR, exist_ok=True)
+def read_block(block_path: str) -> Dict:
+    # {"datos": bytes, "siguiente", "eof", "crc32"}; los bloques JSON de volúmenes anteriores se siguen leyendo
+    with open(block_path, 'rb') as f:
+        raw = f.read()
+    if block_path.endswith(LEGACY_BLOCK_EXT):
+        block = json.loads(raw)
+        block["datos"] = block["datos"].encode(TEXT_ENCODING)
+        return block
+    try:
+        magic, flags, crc32, size, next_len = BLOCK_HEADER.unpack_from(raw)
+    except struct.error as e:
+        raise ValueError(f"Cabecera de bloque inválida: {e}")
+    start = BLOCK_HEADER.size + next_len
+    if magic != BLOCK_MAGIC or len(raw) != start + size:
+        raise ValueError("Cabecera de bloque inválida.")
+    next_block_path = raw[BLOCK_HEADER.size:start].decode(TEXT_ENCODING) or None
+    return {"datos": raw[start:], "siguiente": next_block_path, "eof": bool(flags & 1), "crc32": crc32}
+
+def read_block_into(block_path: str, view: memoryview) -> Tuple[int, Optional[str], bool]:
+    # Los datos van directo de readinto() al buffer del llamador, sin bytes intermedios
+    if block_path.endswith(LEGACY_BLOCK_EXT):
+        block = read_block(block_path)
+        data = block["datos"]
+        if len(data) > len(view):
+            raise BlockCorruptionError(f"La cadena excede el tamaño esperado en {block_path}.")
+        view[:len(data)] = data
+        verify_block(block, block_path)
+        return len(data), block.get("siguiente"), block["eof"]
+    with open(block_path, 'rb', buffering=0) as f:
+        header = f.read(BLOCK_HEADER.size)
+        if len(header) != BLOCK_HEADER.size:
+            raise ValueError("Cabecera de bloque inválida.")
+        magic, flags, crc32, size, next_len = BLOCK_HEADER.unpack(header)
+        if magic != BLOCK_MAGIC:
+            raise ValueError("Cabecera de bloque inválida.")
+        next_block_path = f.read(next_len).decode(TEXT_ENCODING) or None
+        if size > len(view):
+            raise BlockCorruptionError(f"La cadena excede el tamaño esperado en {block_path}.")
+        target = view[:size]
+        if f.readinto(target) != size:
+            raise ValueError("Bloque truncado.")
+    if zlib.crc32(target) != crc32:
+        raise BlockCorruptionError(f"Checksum inválido en {block_path}.")
+    return size, next_block_path, bool(flags & 1)
+
+def _is_sharded(files) -> bool:
+    # Sin fat_shards importado no puede haber una FAT particionada cargada
+    module = sys.modules.get("fat_shards")
+    return module is not None and isinstance(files, module.ShardedFat)
+
+def _is_binary(files) -> bool:
+    module = sys.modules.get("fat_binary")
+    return module is not None and isinstance(files, module.BinaryFat)
 
 def load_fat() -> Dict:
+    # Si el volumen fue particionado (fat_shards.py) o convertido al formato binario
+    # (fat_binary.py), ese formato tiene prioridad
+    if os.path.isdir(FAT_SHARDS_DIR):
+        from fat_shards import load_sharded_fat
+        return load_sharded_fat(FAT_SHARDS_DIR)
+    if os.path.exists(FAT_BIN_FILE):
+        from fat_binary import load_binary_fat
+        return load_binary_fat(FAT_BIN_FILE)
     if os.path.exists(FAT_FILE):
         with open(FAT_FILE, 'r') as f:
-            return json.load(f)
+            return load_compact_fat(f)
     return {"files": {}}
 
 def save_fat(fat: Dict):
-    with open(FAT_FILE, 'w') as f:
-        json.dump(fat, f, indent=4)
+    ensure_fs_dir()
+    if _is_sharded(fat["files"]):
+        # Solo los shards con cambios
+        fat["files"].save()
+        for path in fat["files"].last_saved:
+            notify_change(path)
+        return
+    if _is_binary(fat["files"]) or os.path.exists(FAT_BIN_FILE):
+        from fat_binary import write_binary_fat
+        write_binary_fat(FAT_BIN_FILE, fat["files"])
+        notify_change(FAT_BIN_FILE)
+        return
+    write_json(FAT_FILE, fat, default=to_json)
 
 def load_users() -> Dict:
     if os.path.exists(USERS_FILE):
@@ -28,81 +266,251 @@ def load_users() -> Dict:
     return {}
 
 def save_users(users: Dict):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f, indent=4)
-
-def create_block(data: str, block_id: str) -> str:
-    block_file = os.path.join(FS_DIR, f"{BLOCK_PREFIX}{block_id}.json")
-    block = {
-        "datos": data,
-        "siguiente": None,
-        "eof": True
-    }
-    with open(block_file, 'w') as f:
-        json.dump(block, f, indent=4)
+    ensure_fs_dir()
+    write_json(USERS_FILE, users)
+
+def load_sessions() -> Dict:
+    if os.path.exists(SESSIONS_FILE):
+        with open(SESSIONS_FILE, 'r') as f:
+            return json.load(f)
+    return {}
+
+def save_sessions(sessions: Dict):
+    ensure_fs_dir()
+    write_json(SESSIONS_FILE, sessions)
+
+def empty_usage() -> Dict:
+    return {"archivos": 0, "caracteres": 0, "papelera_caracteres": 0, "bloques": 0}
+
+def entry_bytes(fat_entry: Dict) -> int:
+    # Las entradas anteriores al almacenamiento por bytes solo conocen su tamaño en caracteres
+    return fat_entry.get("total_bytes", fat_entry["total_caracteres"])
+
+def entry_blocks(fat_entry: Dict) -> int:
+    return -(-entry_bytes(fat_entry) // BLOCK_SIZE)
+
+def entry_stored_blocks(fat_entry: Dict) -> int:
+    # Bloques del contenido actual más los que solo conservan sus versiones anteriores
+    return entry_blocks(fat_entry) + fat_entry.get("bloques_versiones", 0)
+
+def compute_usage(fat: Dict) -> Dict:
+    # Recorrido completo de la FAT: solo para la auditoría y para volúmenes sin usage.json
+    volume = empty_usage()
+    users: Dict[str, Dict] = {}
+    for _, entry in fat["files"].items():
+        for counters in (volume, users.setdefault(entry["owner"], empty_usage())):
+            counters["archivos"] += 1
+            counters["bloques"] += entry_stored_blocks(entry)
+            if entry["papelera"]:
+                counters["papelera_caracteres"] += entry["total_caracteres"]
+            else:
+                counters["caracteres"] += entry["total_caracteres"]
+    return {"volumen": volume, "usuarios": users}
+
+def load_usage() -> Optional[Dict]:
+    if os.path.exists(USAGE_FILE):
+        with open(USAGE_FILE, 'r') as f:
+            return json.load(f)
+    return None
+
+def save_usage(usage: Dict):
+    ensure_fs_dir()
+    write_json(USAGE_FILE, usage)
+
+def create_block(data: bytes, block_id: str) -> str:
+    ensure_fs_dir()
+    block_file = get_block_path(block_id)
+    write_block(block_file, data, None, True)
     return block_file
 
-def create_blocks(content: str, file_name: str, start_index: int = 0) -> List[str]:
+def create_blocks(content: Union[bytes, memoryview], file_name: str, start_index: int = 0) -> List[str]:
+    ensure_fs_dir()
+    view = memoryview(content).cast("B")
+    base = block_base(file_name)
     blocks = []
-    i = 0
-    while i < len(content):
-        chunk = content[i:i + BLOCK_SIZE]
+    for i in range(0, len(view), BLOCK_SIZE):
         block_num = start_index + len(blocks)
-        block_id = f"{file_name}_{block_num}"
-        block_file = os.path.join(FS_DIR, f"{BLOCK_PREFIX}{block_id}.json")
-        is_eof = (i + BLOCK_SIZE >= len(content))
-        
-        next_block_path = None
-        if not is_eof:
-            next_block_id = f"{file_name}_{block_num + 1}"
-            next_block_path = os.path.join(FS_DIR, f"{BLOCK_PREFIX}{next_block_id}.json")
-
-        block_data = {
-            "datos": chunk,
-            "siguiente": next_block_path,
-            "eof": is_eof
-        }
-        
-        with open(block_file, 'w') as f:
-            json.dump(block_data, f, indent=4)
-        
+        block_file = get_block_path(f"{base}_{block_num}")
+        is_eof = (i + BLOCK_SIZE >= len(view))
+        next_block_path = None if is_eof else get_block_path(f"{base}_{block_num + 1}")
+        write_block(block_file, view[i:i + BLOCK_SIZE], next_block_path, is_eof)
         blocks.append(block_file)
-        i += BLOCK_SIZE
-        
     return blocks
 
 def delete_blocks(first_block_path: str):
+    seen = set()
     current = first_block_path
-    while current:
+    while current and current not in seen:
+        seen.add(current)
         if os.path.exists(current):
             try:
-                with open(current, 'r') as f:
-                    block = json.load(f)
-                next_block = block.get("siguiente")
-                os.remove(current)
+                next_block = read_block(current).get("siguiente")
+                remove_block(current)
                 current = next_block
             except Exception:
                 break
         else:
             break
 
-def read_file_content(first_block_path: str) -> str:
-    content = ""
+def relocate_chain(first_block_path: Optional[str], file_name: str) -> Optional[str]:
+    # Copia la cadena a los bloques del nuevo nombre (contiguos desde 0) y borra los viejos
+    if not first_block_path:
+        return first_block_path
+    old_paths = []
+    blocks = []
+    current = first_block_path
+    while current and current not in old_paths and os.path.exists(current):
+        block = read_block(current)
+        old_paths.append(current)
+        blocks.append(block)
+        if block.get("eof"):
+            break
+        current = block.get("siguiente")
+
+    new_paths = [get_block_path(f"{block_base(file_name)}_{i}") for i in range(len(blocks))]
+    if new_paths == old_paths:
+        return first_block_path
+    for i, block in enumerate(blocks):
+        is_eof = (i == len(blocks) - 1)
+        write_block(new_paths[i], block["datos"], None if is_eof else new_paths[i + 1], is_eof, block.get("crc32"))
+    for old_path in old_paths:
+        if old_path not in new_paths:
+            remove_block(old_path)
+    return new_paths[0]
+
+def read_chain(first_block_path: Optional[str]) -> List[Tuple[str, Dict]]:
+    # [(ruta, bloque)] de una cadena completa, verificando cada checksum
+    chain = []
+    seen = set()
     current = first_block_path
     while current:
-        if os.path.exists(current):
-            try:
-                with open(current, 'r') as f:
-                    block = json.load(f)
-                content += block["datos"]
-                if block["eof"]:
-                    break
-                current = block.get("siguiente")
-            except Exception:
-                break
-        else:
+        _enter_block(current, seen)
+        try:
+            block = read_block(current)
+        except (OSError, ValueError):
+            raise BlockCorruptionError(f"Bloque ilegible: {current}.")
+        verify_block(block, current)
+        chain.append((current, block))
+        if block["eof"]:
+            break
+        current = block.get("siguiente")
+    return chain
+
+def _block_index(block_path: str) -> int:
+    index = os.path.splitext(block_path)[0].rpartition("_")[2]
+    return int(index) if index.isdigit() else -1
+
+def link_block(source: str, target: str):
+    # Un enlace duro comparte los datos del bloque sin copiarlos; donde no se puede, se copia
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+    notify_change(target)
+
+def write_versioned_chain(old_chain: List[Tuple[str, Dict]], data: Union[bytes, memoryview], file_name: str) -> List[str]:
+    # Escribe el contenido nuevo sobre las posiciones de la cadena actual: los bloques que no
+    # cambian (mismos datos y mismo enlace) no se tocan y siguen compartidos con la versión
+    view = memoryview(data).cast("B")
+    count = -(-len(view) // BLOCK_SIZE)
+    paths = [path for path, _ in old_chain[:count]]
+    base = block_base(file_name)
+    next_index = max((_block_index(path) for path, _ in old_chain), default=-1) + 1
+    while len(paths) < count:
+        candidate = get_block_path(f"{base}_{next_index}")
+        next_index += 1
+        if not os.path.exists(candidate):
+            paths.append(candidate)
+
+    for i, block_path in enumerate(paths):
+        chunk = view[i * BLOCK_SIZE:(i + 1) * BLOCK_SIZE]
+        is_eof = (i == count - 1)
+        next_block_path = None if is_eof else paths[i + 1]
+        if i < len(old_chain):
+            old = old_chain[i][1]
+            if old["datos"] == chunk and old.get("siguiente") == next_block_path and bool(old["eof"]) == is_eof:
+                continue
+        write_block(block_path, chunk, next_block_path, is_eof, replace=True)
+    for block_path, _ in old_chain[count:]:
+        remove_block(block_path)
+    return paths
+
+def read_blocks_into(block_paths: List[str], buffer) -> int:
+    # Lectura de una versión: la lista de bloques es explícita, no hace falta seguir enlaces
+    view = memoryview(buffer).cast("B")
+    written = 0
+    for block_path in block_paths:
+        try:
+            size, _, _ = read_block_into(block_path, view[written:])
+        except (OSError, ValueError):
+            raise BlockCorruptionError(f"Bloque ilegible: {block_path}.")
+        written += size
+    return written
+
+def version_private_blocks(versions: List[Dict], current_paths: List[str]) -> int:
+    # Bloques que solo existen por las versiones: inodos distintos que no usa la cadena actual
+    def inode(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_dev, st.st_ino
+
+    current = {inode(path) for path in current_paths}
+    kept = {inode(path) for version in versions for path in version["bloques"]}
+    return len(kept - current - {None})
+
+def _enter_block(current: str, seen: set):
+    if current in seen:
+        raise BlockCorruptionError(f"Ciclo en la cadena de bloques ({current}).")
+    seen.add(current)
+    if not os.path.exists(current):
+        raise BlockCorruptionError(f"Bloque faltante: {current}.")
+
+def read_file_into(first_block_path: Optional[str], buffer, prefetch: Optional["ChainPrefetch"] = None) -> int:
+    # Llena buffer (bytearray, mmap, array...) con el contenido; devuelve los bytes escritos
+    view = memoryview(buffer).cast("B")
+    written = 0
+    seen = set()
+    current = first_block_path
+    while current:
+        _enter_block(current, seen)
+        if prefetch:
+            prefetch.advance(current)
+        try:
+            size, next_block_path, eof = read_block_into(current, view[written:])
+        except (OSError, ValueError):
+            raise BlockCorruptionError(f"Bloque ilegible: {current}.")
+        written += size
+        if eof:
             break
-    return content
+        current = next_block_path
+    return written
+
+def read_file_bytes(first_block_path: Optional[str], prefetch: Optional["ChainPrefetch"] = None) -> bytes:
+    parts = []
+    seen = set()
+    current = first_block_path
+    while current:
+        _enter_block(current, seen)
+        if prefetch:
+            prefetch.advance(current)
+        try:
+            block = read_block(current)
+        except (OSError, ValueError):
+            raise BlockCorruptionError(f"Bloque ilegible: {current}.")
+        verify_block(block, current)
+        parts.append(block["datos"])
+        if block["eof"]:
+            break
+        current = block.get("siguiente")
+    return b"".join(parts)
+
+def read_file_content(first_block_path: str, encoding: str = TEXT_ENCODING,
+                      prefetch: Optional["ChainPrefetch"] = None) -> str:
+    return read_file_bytes(first_block_path, prefetch).decode(encoding)
 
 def has_permission(fat_entry: Dict, current_user: str, action: str) -> bool:
     if fat_entry["owner"] == current_user:
@@ -110,6 +518,8 @@ def has_permission(fat_entry: Dict, current_user: str, action: str) -> bool:
     if action == "admin" and current_user == "admin":
         return True
         
+    if isinstance(fat_entry, CompactEntry):
+        return fat_entry.allows(current_user, action)
     perms = fat_entry.get("permissions", {})
     user_perms = perms.get(current_user, [])
     if action == "read" and "lectura" in user_perms:
@@ -118,12 +528,92 @@ def has_permission(fat_entry: Dict, current_user: str, action: str) -> bool:
         return True
     return False
 
+def synchronized(method):
+    # Las operaciones que cambian metadatos no se mezclan con el flush en segundo plano y
+    # parten de los metadatos al día si otro proceso cambió el volumen. Solo la llamada
+    # externa revalida: una anidada no debe cambiar la FAT debajo de la que la llamó
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            self._lock_depth += 1
+            try:
+                if self._lock_depth == 1:
+                    self.revalidate()
+                return method(self, *args, **kwargs)
+            finally:
+                self._lock_depth -= 1
+    return wrapper
+
 class FileSystemController:
     def __init__(self):
-        self.fat = self.load_fat()
-        self.users = self.load_users()
+        self._fat = None
+        self._users = None
+        self._usage = None
+        self._dirs = None
+        self._dentries: OrderedDict = OrderedDict()
+        # Cambios todavía no escritos: claves de la FAT, usuarios, registros de directorio y
+        # enlaces padre -> hijo (rutas), más los contadores de uso
+        self._dirty: Dict[str, set] = {"files": set(), "users": set(), "dirs": set(), "links": set()}
+        self._dirty_usage = False
+        self._flush_timer: Optional[threading.Timer] = None
+        self._audit_stop = threading.Event()
+        self._exit_hook = False
+        self._stamp = volume_stamp()
+        self._index_worker = None
+        # Lectura anticipada de cadenas secuenciales: opcional (controller.readahead = ReadAhead())
+        self.readahead: Optional["ReadAhead"] = None
         self.current_user = None
         self.user_role = None
+        self.session_token: Optional[str] = None
+        self._sessions: Optional[SessionStore] = None
+        # Serializa el acceso a cadenas de bloques con procesos en segundo plano (desfragmentador)
+        self.lock = threading.RLock()
+        self._lock_depth = 0
+
+    # La FAT y los usuarios se cargan recién en el primer acceso
+    @property
+    def fat(self) -> Dict:
+        if self._fat is None:
+            self._fat = self.load_fat()
+        return self._fat
+
+    @fat.setter
+    def fat(self, fat: Dict):
+        self._fat = fat
+
+    @property
+    def users(self) -> Dict:
+        if self._users is None:
+            self._users = self.load_users()
+            self._hash_legacy_passwords()
+        return self._users
+
+    @users.setter
+    def users(self, users: Dict):
+        self._users = users
+
+    @property
+    def sessions(self) -> SessionStore:
+        if self._sessions is None:
+            self._sessions = SessionStore(load_sessions, save_sessions)
+        return self._sessions
+
+    @property
+    def usage(self) -> Dict:
+        if self._usage is None:
+            usage = load_usage()
+            if usage is None:
+                usage = compute_usage(self.fat)
+                usage["capacidad_bloques"] = None
+            self._usage = usage
+        return self._usage
+
+    @property
+    def dirs(self) -> Dict:
+        if self._dirs is None:
+            dirs = load_directories()
+            self._dirs = dirs if dirs is not None else build_directories(self.fat)
+        return self._dirs
 
     def load_fat(self) -> Dict:
         return load_fat()
@@ -138,37 +628,550 @@ class FileSystemController:
         save_users(users)
 
     def save_all(self):
-        self.save_fat(self.fat)
-        self.save_users(self.users)
+        # Escritura completa e inmediata (logout, fsck): no depende del registro de cambios
+        with self.lock:
+            self._cancel_flush_timer()
+            if _is_sharded(self.fat["files"]):
+                # Las reparaciones de fsck cambian entradas en el lugar: se escriben todos los shards cargados
+                self.fat["files"].save(force=True)
+                for path in self.fat["files"].last_saved:
+                    notify_change(path)
+            else:
+                self.save_fat(self.fat)
+            # Los usuarios van aparte y solo si cambiaron: el login no reescribe users.json
+            if self._dirty["users"]:
+                self.save_users(self.users)
+            if self._usage is not None:
+                save_usage(self._usage)
+            if self._dirs is not None:
+                save_directories(self._dirs)
+            self._clear_dirty()
+
+    def mark_dirty(self, files=(), users=(), dirs=(), links=(), usage: bool = False):
+        with self.lock:
+            self._dirty["files"].update(files)
+            self._dirty["users"].update(users)
+            self._dirty["dirs"].update(dirs)
+            self._dirty["links"].update(links)
+            self._dirty_usage = self._dirty_usage or usage
+
+    def _dirty_count(self) -> int:
+        return sum(len(keys) for keys in self._dirty.values())
+
+    def _clear_dirty(self):
+        for keys in self._dirty.values():
+            keys.clear()
+        self._dirty_usage = False
+        self._stamp = volume_stamp()
+
+    def _write_back(self):
+        # Después de cada operación: flush inmediato si hay muchos cambios, si no en FLUSH_INTERVAL
+        with self.lock:
+            if self._dirty_count() >= FLUSH_MAX_DIRTY:
+                self.flush()
+            elif self._flush_timer is None and (self._dirty_count() or self._dirty_usage):
+                if not self._exit_hook:
+                    atexit.register(self.flush)
+                    self._exit_hook = True
+                self._flush_timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _cancel_flush_timer(self):
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+
+    def flush(self):
+        # Escribe solo las estructuras con cambios pendientes
+        with self.lock:
+            self._cancel_flush_timer()
+            if not self._dirty_count() and not self._dirty_usage:
+                return
+            # Si otro proceso escribió mientras tanto, se combinan sus cambios con los nuestros
+            self.revalidate()
+            if self._dirty["files"]:
+                if _is_sharded(self.fat["files"]):
+                    # Las entradas se modifican en el lugar: el shard de cada una se marca a mano
+                    self.fat["files"].touch(self._dirty["files"])
+                self.save_fat(self.fat)
+            if self._dirty["users"]:
+                self.save_users(self.users)
+            if self._dirty_usage and self._usage is not None:
+                save_usage(self._usage)
+            if (self._dirty["dirs"] or self._dirty["links"]) and self._dirs is not None:
+                save_directories(self._dirs)
+            self._clear_dirty()
+
+    def revalidate(self) -> bool:
+        # Recarga los metadatos solo si otro proceso cambió el volumen (mtime/tamaño/inodo).
+        # Las entradas con cambios propios sin escribir se vuelven a aplicar sobre lo recargado.
+        with self.lock:
+            stamp = volume_stamp()
+            if stamp == self._stamp:
+                if self._fat is not None and _is_sharded(self._fat["files"]):
+                    self._fat["files"].touch(self._dirty["files"])
+                    return self._fat["files"].refresh()
+                return False
+            self._stamp = stamp
+            if self._fat is not None:
+                fat = self.load_fat()
+                for name in self._dirty["files"]:
+                    entry = self._fat["files"].get(name)
+                    if entry is None:
+                        fat["files"].pop(name, None)
+                    else:
+                        fat["files"][name] = entry
+                if _is_binary(self._fat["files"]) and self._fat["files"] is not fat["files"]:
+                    self._fat["files"].close()
+                self._fat = fat
+            if self._users is not None:
+                users = self.load_users()
+                for username in self._dirty["users"]:
+                    if username in self._users:
+                        users[username] = self._users[username]
+                    else:
+                        users.pop(username, None)
+                self._users = users
+                self._hash_legacy_passwords()
+            if self._usage is not None:
+                if self._dirty_usage:
+                    # Los contadores no se pueden combinar por entrada: se recalculan
+                    capacity = self._usage.get("capacidad_bloques")
+                    self._usage = compute_usage(self.fat)
+                    self._usage["capacidad_bloques"] = capacity
+                else:
+                    self._usage = None
+            if self._dirs is not None:
+                self._dirs = self._merge_directories(load_directories() or build_directories(self.fat))
+            self._dentries.clear()
+            return True
+
+    def _merge_directories(self, dirs: Dict) -> Dict:
+        for path in self._dirty["dirs"]:
+            if path in self._dirs:
+                on_disk = dirs.get(path)
+                dirs[path] = dict(self._dirs[path], hijos=on_disk["hijos"] if on_disk else dict(self._dirs[path]["hijos"]))
+            else:
+                dirs.pop(path, None)
+        for path in self._dirty["links"]:
+            parent, _, child = path.rpartition("/")
+            if parent not in dirs:
+                continue
+            kind = self._dirs.get(parent, {}).get("hijos", {}).get(child)
+            if kind is None:
+                dirs[parent]["hijos"].pop(child, None)
+            else:
+                dirs[parent]["hijos"][child] = kind
+        return dirs
+
+    def lookup(self, path: str) -> Optional[str]:
+        # Resolución de rutas componente a componente con caché de dentries (LRU).
+        # Devuelve "archivo", "directorio" o None; los fallos también se cachean.
+        if path in self._dentries:
+            self._dentries.move_to_end(path)
+            return self._dentries[path]
+        if path == ROOT_DIR:
+            kind = "directorio"
+        else:
+            parent, _, child = path.rpartition("/")
+            kind = None
+            if self.lookup(parent) == "directorio":
+                kind = self.dirs[parent]["hijos"].get(child)
+        self._dentries[path] = kind
+        if len(self._dentries) > DENTRY_CACHE_SIZE:
+            self._dentries.popitem(last=False)
+        return kind
+
+    def link_path(self, path: str, kind: str):
+        parent, _, child = path.rpartition("/")
+        self.dirs[parent]["hijos"][child] = kind
+        self._dentries.pop(path, None)
+        self.mark_dirty(links=[path])
+
+    def unlink_path(self, path: str):
+        parent, _, child = path.rpartition("/")
+        self.dirs[parent]["hijos"].pop(child, None)
+        self._dentries.pop(path, None)
+        self.mark_dirty(links=[path])
+
+    @synchronized
+    def mkdir(self, path: str) -> str:
+        if not self.current_user: return "Error: Debe estar logueado."
+        path = normalize_path(path)
+        if not path: return "Error: Ruta inválida."
+        if self.lookup(path): return "Error: Ya existe un archivo o directorio con ese nombre."
+        parent = path.rpartition("/")[0]
+        if self.lookup(parent) != "directorio": return f"Error: Directorio '{parent}' no existe."
+
+        self.dirs[path] = new_directory(self.current_user)
+        self.link_path(path, "directorio")
+        self.mark_dirty(dirs=[path])
+        self._write_back()
+        return f"Éxito: Directorio '{path}' creado."
+
+    @synchronized
+    def rmdir(self, path: str) -> str:
+        path = normalize_path(path)
+        if not path: return "Error: No se puede eliminar la raíz."
+        if self.lookup(path) != "directorio": return "Error: Directorio no existe."
+        directory = self.dirs[path]
+        if not self.is_admin() and directory["owner"] != self.current_user: return "Error: Solo el owner o admin puede eliminar el directorio."
+        if directory["hijos"]: return "Error: El directorio no está vacío."
+
+        del self.dirs[path]
+        self.unlink_path(path)
+        self.mark_dirty(dirs=[path])
+        self._write_back()
+        return f"Éxito: Directorio '{path}' eliminado."
+
+    @synchronized
+    def list_dir(self, path: str = ROOT_DIR, is_trash=False) -> List[Dict]:
+        # O(hijos del directorio), sin recorrer toda la FAT
+        path = normalize_path(path)
+        if path is None or self.lookup(path) != "directorio": return []
+        listing = []
+        for child, kind in self.dirs[path]["hijos"].items():
+            full_path = f"{path}/{child}" if path else child
+            if kind == "directorio":
+                listing.append({"name": child, "path": full_path, "tipo": kind, "owner": self.dirs[full_path]["owner"]})
+                continue
+            entry = self.fat["files"][full_path]
+            if entry["papelera"] != is_trash:
+                continue
+            if not is_trash and not self.has_read_permission_logic(entry):
+                continue
+            listing.append({"name": child, "path": full_path, "tipo": kind, **entry})
+        return listing
+
+    @synchronized
+    def move(self, source: str, destination: str) -> str:
+        source = normalize_path(source)
+        destination = normalize_path(destination)
+        if not source or destination is None: return "Error: Ruta inválida."
+        kind = self.lookup(source)
+        if kind is None: return "Error: Archivo o directorio no existe."
+        if self.lookup(destination) == "directorio":
+            destination = f"{destination}/{source.rpartition('/')[2]}" if destination else source.rpartition("/")[2]
+        if destination == source: return "Error: Origen y destino son iguales."
+        if self.lookup(destination): return "Error: El destino ya existe."
+        parent = destination.rpartition("/")[0]
+        if self.lookup(parent) != "directorio": return f"Error: Directorio '{parent}' no existe."
+
+        owner = self.dirs[source]["owner"] if kind == "directorio" else self.fat["files"][source]["owner"]
+        if not self.is_admin() and owner != self.current_user: return "Error: Solo el owner o admin puede mover."
+
+        with self.lock:
+            if kind == "archivo":
+                self._move_file(source, destination)
+            else:
+                if destination.startswith(source + "/"): return "Error: No se puede mover un directorio dentro de sí mismo."
+                self._move_directory(source, destination)
+            self.unlink_path(source)
+            self.link_path(destination, kind)
+            # Los bloques viejos ya se borraron: la FAT nueva se escribe enseguida
+            self.flush()
+        return f"Éxito: '{source}' movido a '{destination}'."
+
+    def _move_file(self, source: str, destination: str):
+        entry = self.fat["files"][source]
+        # Los bloques se nombran según la ruta: se reubican para que no choquen con un archivo nuevo en el origen
+        entry["ruta_datos_inicial"] = relocate_chain(entry["ruta_datos_inicial"], destination)
+        if entry.get("versiones"):
+            entry["versiones"] = self._rename_versions(entry["versiones"], destination)
+            self.refresh_version_blocks(entry)
+        entry["nombre"] = destination
+        del self.fat["files"][source]
+        self.fat["files"][destination] = entry
+        self.mark_dirty(files=[source, destination])
+        worker = self.get_index_worker()
+        worker.submit("remove", source)
+        if not entry["papelera"]:
+            worker.submit("add", destination, self._content_loader(destination))
+
+    def _rename_versions(self, versions: List[Dict], destination: str) -> List[Dict]:
+        # Los bloques de las versiones también llevan el nombre del archivo: se renombran (sin copiar)
+        renamed = []
+        for version in versions:
+            paths = []
+            for i, block_path in enumerate(version["bloques"]):
+                new_path = get_version_block_path(block_path, destination, version["version"], i)
+                os.replace(block_path, new_path)
+                notify_change(block_path)
+                notify_change(new_path)
+                paths.append(new_path)
+            renamed.append(dict(version, bloques=paths))
+        return renamed
+
+    def _move_directory(self, source: str, destination: str):
+        # Recorre solo el subárbol movido, usando las tablas de hijos
+        pending = [(source, destination)]
+        while pending:
+            old_dir, new_dir = pending.pop()
+            directory = self.dirs.pop(old_dir)
+            self.dirs[new_dir] = directory
+            self.mark_dirty(dirs=[old_dir, new_dir])
+            for child, kind in directory["hijos"].items():
+                if kind == "directorio":
+                    pending.append((f"{old_dir}/{child}", f"{new_dir}/{child}"))
+                else:
+                    self._move_file(f"{old_dir}/{child}", f"{new_dir}/{child}")
+        self._dentries.clear()
+
+    def _account(self, entry: Dict, sign: int):
+        # Suma (sign=1) o resta (sign=-1) el aporte de una entrada a los contadores: O(1)
+        with self.lock:
+            user_usage = self.usage["usuarios"].setdefault(entry["owner"], empty_usage())
+            for counters in (self.usage["volumen"], user_usage):
+                counters["archivos"] += sign
+                counters["bloques"] += sign * entry_stored_blocks(entry)
+                if entry["papelera"]:
+                    counters["papelera_caracteres"] += sign * entry["total_caracteres"]
+                else:
+                    counters["caracteres"] += sign * entry["total_caracteres"]
+            self._dirty_usage = True
+
+    def _check_quota(self, owner: str, new_chars: int, released: Optional[Dict] = None,
+                     new_bytes: Optional[int] = None) -> Optional[str]:
+        # released: entrada cuyo espacio se libera en la misma operación (modificar o reemplazar)
+        freed_chars = released["total_caracteres"] if released else 0
+        # Con versionado la cadena anterior queda guardada como versión: sus bloques no se liberan
+        freed_blocks = entry_blocks(released) if released and not released.get("max_versiones") else 0
+        new_blocks = -(-(new_chars if new_bytes is None else new_bytes) // BLOCK_SIZE)
+
+        quota = self.users.get(owner, {}).get("cuota_caracteres")
+        if quota is not None:
+            user_usage = self.usage["usuarios"].get(owner, empty_usage())
+            used = user_usage["caracteres"] + user_usage["papelera_caracteres"] - freed_chars
+            if used + new_chars > quota:
+                return f"Error: Cuota excedida para '{owner}' ({used + new_chars}/{quota} caracteres)."
+
+        capacity = self.usage.get("capacidad_bloques")
+        if capacity is not None:
+            used_blocks = self.usage["volumen"]["bloques"] - freed_blocks
+            if used_blocks + new_blocks > capacity:
+                return f"Error: Volumen lleno ({used_blocks + new_blocks}/{capacity} bloques)."
+        return None
+
+    @synchronized
+    def set_quota(self, username: str, max_chars: Optional[int]) -> str:
+        if not self.is_admin(): return "Error: Solo el admin puede asignar cuotas."
+        if username not in self.users: return "Error: Usuario no existe."
+        if max_chars is not None and max_chars < 0: return "Error: La cuota no puede ser negativa."
+        self.users[username]["cuota_caracteres"] = max_chars
+        self.mark_dirty(users=[username])
+        self._write_back()
+        return f"Éxito: Cuota de '{username}' actualizada."
+
+    @synchronized
+    def set_volume_capacity(self, max_blocks: Optional[int]) -> str:
+        if not self.is_admin(): return "Error: Solo el admin puede cambiar la capacidad."
+        self.usage["capacidad_bloques"] = max_blocks
+        self.mark_dirty(usage=True)
+        self._write_back()
+        return "Éxito: Capacidad del volumen actualizada."
+
+    def get_usage(self) -> Dict:
+        usage = self.usage
+        volume = dict(usage["volumen"])
+        capacity = usage.get("capacidad_bloques")
+        volume["capacidad_bloques"] = capacity
+        volume["bloques_libres"] = None if capacity is None else capacity - volume["bloques"]
+        users = {}
+        for username, counters in usage["usuarios"].items():
+            users[username] = dict(counters, cuota_caracteres=self.users.get(username, {}).get("cuota_caracteres"))
+        return {"volumen": volume, "usuarios": users}
+
+    def audit_usage(self) -> Dict:
+        # Recalcula los contadores desde la FAT y corrige los que se hayan desviado
+        with self.lock:
+            self.revalidate()
+            expected = compute_usage(self.fat)
+            differences = []
+            if expected["volumen"] != self.usage["volumen"]:
+                differences.append(("(volumen)", self.usage["volumen"], expected["volumen"]))
+            for username in set(expected["usuarios"]) | set(self.usage["usuarios"]):
+                actual = self.usage["usuarios"].get(username, empty_usage())
+                wanted = expected["usuarios"].get(username, empty_usage())
+                if actual != wanted:
+                    differences.append((username, actual, wanted))
+            if differences:
+                self.usage["volumen"] = expected["volumen"]
+                self.usage["usuarios"] = expected["usuarios"]
+                self.mark_dirty(usage=True)
+                self.flush()
+        return {"diferencias": differences}
+
+    def start_usage_audit(self, interval: Optional[float] = None) -> threading.Thread:
+        # Una auditoría en segundo plano; con interval se repite hasta el shutdown
+        def run():
+            self.audit_usage()
+            while interval is not None and not self._audit_stop.wait(interval):
+                self.audit_usage()
+
+        self._audit_stop.clear()
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
         
+    def get_index_worker(self) -> "IndexWorker":
+        # El índice de búsqueda se crea al primer uso; si el volumen no tenía índice se
+        # indexan en segundo plano todos los archivos existentes
+        if self._index_worker is None:
+            from search_index import IndexWorker, SearchIndex
+            is_new = not os.path.isdir(SEARCH_INDEX_DIR)
+            self._index_worker = IndexWorker(SearchIndex(SEARCH_INDEX_DIR))
+            if is_new:
+                self._reindex_all()
+        return self._index_worker
+
+    def _content_loader(self, name: str):
+        def load():
+            entry = self.fat["files"].get(name)
+            encoding = entry.get("codificacion", TEXT_ENCODING) if entry else None
+            if entry is None or entry["papelera"] or encoding is None:
+                return None
+            with self.lock, self._prefetch(entry) as prefetch:
+                return read_file_content(entry["ruta_datos_inicial"], encoding, prefetch)
+        return load
+
+    def _prefetch(self, entry: Dict):
+        return self.readahead.stream(entry_blocks(entry)) if self.readahead else nullcontext()
+
+    def _reindex_all(self):
+        for name, entry in self.fat["files"].items():
+            if not entry["papelera"]:
+                self._index_worker.submit("add", name, self._content_loader(name))
+
+    def rebuild_search_index(self) -> str:
+        if not self.is_admin(): return "Error: Solo el admin puede reconstruir el índice."
+        worker = self.get_index_worker()
+        worker.wait()
+        worker.index.clear()
+        self._reindex_all()
+        return "Éxito: Reconstrucción del índice en curso."
+
+    def shutdown(self):
+        # Antes de salir: escribe los metadatos pendientes y termina de aplicar y guardar
+        # las actualizaciones pendientes del índice
+        self._audit_stop.set()
+        self.flush()
+        if self._index_worker is not None:
+            self._index_worker.wait()
+        if self.readahead is not None:
+            self.readahead.shutdown()
+
+    def search(self, query: str) -> List[Dict]:
+        if not self.current_user: return []
+        worker = self.get_index_worker()
+        # Las búsquedas ven todas las escrituras previas de esta sesión
+        worker.wait()
+        results = []
+        for name, offsets in worker.index.search(query).items():
+            entry = self.fat["files"].get(name)
+            if entry is None or entry["papelera"] or not self.has_read_permission_logic(entry):
+                continue
+            results.append({"name": name, "coincidencias": len(offsets), "offsets": offsets})
+        return sorted(results, key=lambda result: result["name"])
+
     def is_admin(self) -> bool:
         return self.user_role == "admin"
 
     def get_admin_status(self) -> bool:
         return any(u.get("role") == "admin" for u in self.users.values())
 
+    @synchronized
     def register_admin(self, username, password) -> bool:
         if self.get_admin_status() or username in self.users:
             return False
-        self.users[username] = {"password": password, "role": "admin"}
-        self.save_all()
+        self.users[username] = {"password_hash": hash_password(password), "role": "admin"}
+        self.mark_dirty(users=[username])
+        self._write_back()
         return True
 
     def authenticate(self, username, password) -> bool:
+        self.revalidate()
         user_data = self.users.get(username)
-        if user_data and user_data["password"] == password:
-            self.current_user = username
-            self.user_role = user_data["role"]
-            return True
-        return False
+        if user_data is None:
+            return verify_unknown_user(password)
+        if not self._check_password(username, password, user_data):
+            return False
+        self._start_session(username, user_data)
+        return True
+
+    def _hash_legacy_passwords(self):
+        # Usuarios de volúmenes anteriores con la contraseña en texto plano: se hashean al cargar
+        # los usuarios, así no queda ninguna en users.json (ni en el espejo) esperando un login
+        with self.lock:
+            legacy = [username for username, data in self._users.items()
+                      if "password_hash" not in data and "password" in data]
+            for username in legacy:
+                data = self._users[username]
+                updated = {key: value for key, value in data.items() if key != "password"}
+                updated["password_hash"] = hash_password(data["password"])
+                self._users[username] = updated
+            if legacy:
+                self.mark_dirty(users=legacy)
+                self._write_back()
+
+    def _check_password(self, username: str, password: str, user_data: Dict) -> bool:
+        stored = user_data.get("password_hash")
+        if stored is None:
+            return False
+        if not verified_cache.check(username, password, stored):
+            # El KDF corre una vez por credencial; los logins siguientes usan la caché
+            if not verify_password(password, stored):
+                return False
+            verified_cache.add(username, password, stored)
+        if needs_rehash(stored):
+            with self.lock:
+                updated = {key: value for key, value in user_data.items() if key != "password"}
+                updated["password_hash"] = hash_password(password)
+                self.users[username] = updated
+                self.mark_dirty(users=[username])
+                self._write_back()
+        return True
+
+    def _start_session(self, username: str, user_data: Dict):
+        self.current_user = username
+        self.user_role = user_data["role"]
+
+    def issue_token(self) -> Optional[str]:
+        # Token de sesión para no volver a pasar por el KDF (p. ej. varias invocaciones del CLI)
+        if not self.current_user:
+            return None
+        self.session_token = self.sessions.issue(self.current_user)
+        return self.session_token
 
+    def login_token(self, username, password) -> Optional[str]:
+        return self.issue_token() if self.authenticate(username, password) else None
+
+    def authenticate_token(self, token: str) -> bool:
+        self.revalidate()
+        username = self.sessions.resolve(token)
+        user_data = self.users.get(username) if username else None
+        if user_data is None:
+            return False
+        self._start_session(username, user_data)
+        self.session_token = token
+        return True
+
+    def logout(self, revoke: bool = False):
+        if revoke and self.session_token:
+            self.sessions.revoke(self.session_token)
+        self.current_user = None
+        self.user_role = None
+        self.session_token = None
+
+    @synchronized
     def add_user(self, username, password, role) -> str:
         if not self.is_admin(): return "Error: Solo el admin puede agregar usuarios."
         if username in self.users: return "Error: El usuario ya existe."
         if not username or not password: return "Error: Usuario y contraseña no pueden estar vacíos."
         
-        self.users[username] = {"password": password, "role": role}
-        self.save_all()
+        self.users[username] = {"password_hash": hash_password(password), "role": role}
+        self.mark_dirty(users=[username])
+        self._write_back()
         return f"Éxito: Usuario '{username}' creado como {role}."
         
     def has_read_permission_logic(self, fat_entry: Dict) -> bool:
@@ -180,56 +1183,164 @@ class FileSystemController:
         return self.is_admin() or has_permission(fat_entry, self.current_user, "write")
 
     def create_file(self, name: str, content: str) -> str:
+        # Envoltorio de texto: se guarda codificado en TEXT_ENCODING
+        return self.create_file_bytes(name, content.encode(TEXT_ENCODING), TEXT_ENCODING)
+
+    @synchronized
+    def create_file_bytes(self, name: str, data: bytes, encoding: Optional[str] = None) -> str:
+        # encoding=None: archivo binario, no se abre como texto ni se indexa
         # Permiso de creación: Solo Admin o User
         if not self.current_user: return "Error: Debe estar logueado."
         
-        if not name or not content: return "Error: Nombre y contenido no pueden estar vacíos."
+        if not name or not data: return "Error: Nombre y contenido no pueden estar vacíos."
+        name = normalize_path(name)
+        if not name: return "Error: Ruta inválida."
         if name in self.fat["files"] and not self.fat["files"][name]["papelera"]: 
             return "Error: Archivo ya existe."
+        if self.lookup(name) == "directorio": return "Error: Ya existe un directorio con ese nombre."
+        parent = name.rpartition("/")[0]
+        if self.lookup(parent) != "directorio": return f"Error: Directorio '{parent}' no existe."
+        try:
+            text = bytes(data).decode(encoding) if encoding else None
+        except (UnicodeDecodeError, LookupError):
+            return f"Error: El contenido no es {encoding} válido."
+        total_chars = len(text) if text is not None else len(data)
+
+        # Un archivo en papelera con el mismo nombre se reemplaza y libera su espacio
+        replaced = self.fat["files"].get(name)
+        released = replaced if replaced and replaced["owner"] == self.current_user else None
+        quota_error = self._check_quota(self.current_user, total_chars, released, len(data))
+        if quota_error: return quota_error
         
         now = datetime.datetime.now().isoformat()
-        blocks = create_blocks(content, name)
+        with self.lock:
+            if replaced:
+                self._account(replaced, -1)
+                if replaced["ruta_datos_inicial"]: delete_blocks(replaced["ruta_datos_inicial"])
+                self._drop_versions(replaced.get("versiones", []))
+            blocks = create_blocks(data, name)
         first_block = blocks[0] if blocks else None
         
-        entry = {
+        entry = compact_entry({
             "nombre": name,
             "ruta_datos_inicial": first_block,
             "papelera": False,
-            "total_caracteres": len(content),
+            "total_caracteres": total_chars,
+            "total_bytes": len(data),
+            "codificacion": encoding,
             "fecha_creacion": now,
             "fecha_modificacion": now,
             "fecha_eliminacion": None,
             "owner": self.current_user,
             "permissions": {}
-        }
+        })
         self.fat["files"][name] = entry
-        self.save_all()
+        self.link_path(name, "archivo")
+        self._account(entry, 1)
+        self.mark_dirty(files=[name])
+        self._write_back()
+        if text is not None:
+            self.get_index_worker().submit("add", name, text)
         return f"Éxito: Archivo '{name}' creado exitosamente."
 
+    @synchronized
     def get_list_files(self, is_trash=False) -> List[Dict]:
-        self.fat = self.load_fat()
+        # Se recarga solo si otro proceso cambió el volumen (synchronized)
         return [
             {"name": name, **entry} 
             for name, entry in self.fat["files"].items() 
             if entry["papelera"] == is_trash
         ]
 
-    def open_file(self, name: str) -> Dict:
+    @synchronized
+    def list_file_names(self, is_trash=False) -> List[str]:
+        # Mismo criterio de visibilidad que el listado de la GUI, pero solo con nombres
+        files = self.fat["files"]
+        visible_to = None if (self.is_admin() or is_trash) else self.current_user
+        if _is_binary(files):
+            return files.list_names(is_trash, visible_to)
+        return [
+            name for name, entry in files.items()
+            if entry["papelera"] == is_trash
+            and (visible_to is None or has_permission(entry, visible_to, "read"))
+        ]
+
+    def _readable_entry(self, name: str) -> Tuple[Optional[Dict], Optional[str]]:
+        # Las lecturas también ven lo que otro proceso escribió (unos stat si nada cambió)
+        with self.lock:
+            if not self._lock_depth:
+                self.revalidate()
         if name not in self.fat["files"]: 
-            return {"error": "Archivo no existe."}
+            return None, "Archivo no existe."
         entry = self.fat["files"][name]
         if entry["papelera"]: 
-            return {"error": "Archivo en papelera."}
+            return None, "Archivo en papelera."
         
         # VALIDACIÓN DE PERMISO DE LECTURA
         if not self.is_admin() and not has_permission(entry, self.current_user, "read"): 
-            return {"error": "Sin permisos de lectura."}
-        
-        content = read_file_content(entry["ruta_datos_inicial"])
+            return None, "Sin permisos de lectura."
+        return entry, None
+
+    def read_into(self, name: str, buffer) -> Dict:
+        # Llena un buffer del llamador (bytearray, mmap, ...) sin copias intermedias
+        name = normalize_path(name) or name
+        entry, error = self._readable_entry(name)
+        if error: return {"error": error}
+        view = memoryview(buffer).cast("B")
+        try:
+            with self.lock, self._prefetch(entry) as prefetch:
+                if "total_bytes" not in entry:
+                    # Entrada anterior al almacenamiento por bytes: el tamaño exacto no está en la FAT
+                    data = read_file_bytes(entry["ruta_datos_inicial"], prefetch)
+                    if len(data) > len(view): return {"error": f"Buffer insuficiente: se necesitan {len(data)} bytes."}
+                    view[:len(data)] = data
+                    return {"entry": entry, "bytes_leidos": len(data)}
+                if entry["total_bytes"] > len(view):
+                    return {"error": f"Buffer insuficiente: se necesitan {entry['total_bytes']} bytes."}
+                read = read_file_into(entry["ruta_datos_inicial"], view[:entry["total_bytes"]], prefetch)
+        except BlockCorruptionError as e:
+            return {"error": f"Archivo dañado: {e}"}
+        return {"entry": entry, "bytes_leidos": read}
+
+    def read_file_bytes(self, name: str) -> Dict:
+        name = normalize_path(name) or name
+        entry, error = self._readable_entry(name)
+        if error: return {"error": error}
+        if "total_bytes" not in entry:
+            try:
+                with self.lock, self._prefetch(entry) as prefetch:
+                    return {"entry": entry, "datos": read_file_bytes(entry["ruta_datos_inicial"], prefetch)}
+            except BlockCorruptionError as e:
+                return {"error": f"Archivo dañado: {e}"}
+        buffer = bytearray(entry["total_bytes"])
+        result = self.read_into(name, buffer)
+        if "error" in result: return result
+        return {"entry": entry, "datos": buffer[:result["bytes_leidos"]]}
+
+    def open_file(self, name: str) -> Dict:
+        # Envoltorio de texto sobre read_file_bytes
+        name = normalize_path(name) or name
+        entry, error = self._readable_entry(name)
+        if error: return {"error": error}
+        encoding = entry.get("codificacion", TEXT_ENCODING)
+        if encoding is None: return {"error": "Archivo binario: use read_file_bytes o read_into."}
+
+        result = self.read_file_bytes(name)
+        if "error" in result: return result
+        try:
+            content = result["datos"].decode(encoding)
+        except UnicodeDecodeError:
+            return {"error": "Archivo dañado: el contenido no se puede decodificar."}
         return {"entry": entry, "content": content}
 
     def modify_file(self, name: str, new_content: str) -> str:
-        if not name or not new_content: return "Error: Nombre y contenido no pueden estar vacíos."
+        # Envoltorio de texto: se guarda codificado en TEXT_ENCODING
+        return self.modify_file_bytes(name, new_content.encode(TEXT_ENCODING), TEXT_ENCODING)
+
+    @synchronized
+    def modify_file_bytes(self, name: str, data: bytes, encoding: Optional[str] = None) -> str:
+        if not name or not data: return "Error: Nombre y contenido no pueden estar vacíos."
+        name = normalize_path(name) or name
         if name not in self.fat["files"]: return "Error: Archivo no existe."
         
         entry = self.fat["files"][name]
@@ -237,19 +1348,193 @@ class FileSystemController:
         
         # VALIDACIÓN DE PERMISO DE ESCRITURA
         if not self.is_admin() and not has_permission(entry, self.current_user, "write"): return "Error: Sin permisos de escritura."
+        try:
+            text = bytes(data).decode(encoding) if encoding else None
+        except (UnicodeDecodeError, LookupError):
+            return f"Error: El contenido no es {encoding} válido."
+        total_chars = len(text) if text is not None else len(data)
         
-        if entry["ruta_datos_inicial"]: delete_blocks(entry["ruta_datos_inicial"])
-        blocks = create_blocks(new_content, name, 0)
-        first_block = blocks[0] if blocks else None
-        
-        now = datetime.datetime.now().isoformat()
-        entry["ruta_datos_inicial"] = first_block
-        entry["total_caracteres"] = len(new_content)
-        entry["fecha_modificacion"] = now
-        self.save_all()
+        quota_error = self._check_quota(entry["owner"], total_chars, entry, len(data))
+        if quota_error: return quota_error
+
+        with self.lock:
+            self._account(entry, -1)
+            if entry.get("max_versiones"):
+                try:
+                    blocks = self._write_new_version(name, entry, data)
+                except BlockCorruptionError as e:
+                    self._account(entry, 1)
+                    return f"Error: Archivo dañado: {e}"
+            else:
+                if entry["ruta_datos_inicial"]: delete_blocks(entry["ruta_datos_inicial"])
+                blocks = create_blocks(data, name, 0)
+            first_block = blocks[0] if blocks else None
+            
+            now = datetime.datetime.now().isoformat()
+            entry["ruta_datos_inicial"] = first_block
+            entry["total_caracteres"] = total_chars
+            entry["total_bytes"] = len(data)
+            entry["codificacion"] = encoding
+            entry["fecha_modificacion"] = now
+            self._account(entry, 1)
+            self.mark_dirty(files=[name])
+            self._write_back()
+        if text is not None:
+            self.get_index_worker().submit("add", name, text)
+        else:
+            self.get_index_worker().submit("remove", name)
         return f"Éxito: Archivo '{name}' modificado exitosamente."
 
+    def _write_new_version(self, name: str, entry: Dict, data: bytes) -> List[str]:
+        # La versión anterior se conserva con enlaces a sus bloques (sin copiar datos) y el
+        # contenido nuevo solo reemplaza los bloques que cambian
+        old_chain = read_chain(entry["ruta_datos_inicial"])
+        number = entry.get("version", 1)
+        snapshot = []
+        for i, (block_path, _) in enumerate(old_chain):
+            version_path = get_version_block_path(block_path, name, number, i)
+            link_block(block_path, version_path)
+            snapshot.append(version_path)
+        versions = list(entry.get("versiones", []))
+        versions.append({
+            "version": number,
+            "fecha_modificacion": entry["fecha_modificacion"],
+            "total_caracteres": entry["total_caracteres"],
+            "total_bytes": sum(len(block["datos"]) for _, block in old_chain),
+            "codificacion": entry.get("codificacion", TEXT_ENCODING),
+            "bloques": snapshot,
+        })
+        blocks = write_versioned_chain(old_chain, data, name)
+        entry["version"] = number + 1
+        self._keep_versions(entry, versions, blocks)
+        return blocks
+
+    def _keep_versions(self, entry: Dict, versions: List[Dict], current_paths: List[str]):
+        # Retención: se descartan las versiones más viejas que excedan max_versiones
+        excess = len(versions) - entry.get("max_versiones", 0)
+        if excess > 0:
+            self._drop_versions(versions[:excess])
+            versions = versions[excess:]
+        entry["versiones"] = versions
+        entry["bloques_versiones"] = version_private_blocks(versions, current_paths)
+
+    def refresh_version_blocks(self, entry: Dict):
+        # Después de reubicar la cadena actual (mover, desfragmentar) sus bloques son inodos nuevos:
+        # los que compartía con las versiones pasan a ser solo de ellas
+        if not entry.get("versiones"):
+            return
+        with self.lock:
+            self._account(entry, -1)
+            try:
+                current_paths = [block_path for block_path, _ in read_chain(entry["ruta_datos_inicial"])]
+            except BlockCorruptionError:
+                current_paths = []
+            entry["bloques_versiones"] = version_private_blocks(entry["versiones"], current_paths)
+            self._account(entry, 1)
+
+    def _drop_versions(self, versions: List[Dict]):
+        # Cada versión tiene sus propios nombres de bloque: los datos compartidos siguen vivos por los otros enlaces
+        for version in versions:
+            for block_path in version["bloques"]:
+                if os.path.exists(block_path):
+                    remove_block(block_path)
+
+    @synchronized
+    def set_version_retention(self, name: str, max_versions: int) -> str:
+        # max_versions = 0 desactiva el versionado y borra las versiones guardadas
+        name = normalize_path(name) or name
+        if name not in self.fat["files"]: return "Error: Archivo no existe."
+        entry = self.fat["files"][name]
+        if not self.is_admin() and entry["owner"] != self.current_user: return "Error: Solo el owner o admin puede configurar versiones."
+        if max_versions < 0: return "Error: La cantidad de versiones no puede ser negativa."
+
+        with self.lock:
+            self._account(entry, -1)
+            if max_versions:
+                try:
+                    current_paths = [block_path for block_path, _ in read_chain(entry["ruta_datos_inicial"])]
+                except BlockCorruptionError:
+                    current_paths = []
+                entry["max_versiones"] = max_versions
+                self._keep_versions(entry, list(entry.get("versiones", [])), current_paths)
+                message = f"Se conservarán hasta {max_versions} versiones de '{name}'."
+            else:
+                self._drop_versions(entry.get("versiones", []))
+                for key in ("max_versiones", "versiones", "bloques_versiones"):
+                    if key in entry:
+                        del entry[key]
+                message = f"Versionado desactivado para '{name}'."
+            self._account(entry, 1)
+            self.mark_dirty(files=[name])
+            self._write_back()
+        return f"Éxito: {message}"
+
+    def _current_version(self, entry: Dict) -> Dict:
+        return {
+            "version": entry.get("version", 1),
+            "fecha_modificacion": entry["fecha_modificacion"],
+            "total_caracteres": entry["total_caracteres"],
+            "total_bytes": entry_bytes(entry),
+            "codificacion": entry.get("codificacion", TEXT_ENCODING),
+            "actual": True,
+        }
+
+    def list_versions(self, name: str) -> Dict:
+        # Versiones guardadas (de la más vieja a la más nueva) y al final la actual
+        name = normalize_path(name) or name
+        entry, error = self._readable_entry(name)
+        if error: return {"error": error}
+        with self.lock:
+            versions = [dict({key: value for key, value in version.items() if key != "bloques"}, actual=False)
+                        for version in entry.get("versiones", [])]
+            versions.append(self._current_version(entry))
+        return {"entry": entry, "versiones": versions, "max_versiones": entry.get("max_versiones", 0)}
+
+    def read_version_bytes(self, name: str, version: int) -> Dict:
+        name = normalize_path(name) or name
+        entry, error = self._readable_entry(name)
+        if error: return {"error": error}
+        with self.lock:
+            if version == entry.get("version", 1):
+                result = self.read_file_bytes(name)
+                if "error" in result: return result
+                return {"entry": entry, "version": self._current_version(entry), "datos": result["datos"]}
+            record = next((v for v in entry.get("versiones", []) if v["version"] == version), None)
+            if record is None: return {"error": f"La versión {version} no existe."}
+            # Igual que read_into: un buffer del tamaño justo y readinto bloque a bloque
+            buffer = bytearray(record["total_bytes"])
+            try:
+                read = read_blocks_into(record["bloques"], buffer)
+            except BlockCorruptionError as e:
+                return {"error": f"Archivo dañado: {e}"}
+        info = dict({key: value for key, value in record.items() if key != "bloques"}, actual=False)
+        return {"entry": entry, "version": info, "datos": buffer[:read]}
+
+    def read_version(self, name: str, version: int) -> Dict:
+        # Envoltorio de texto sobre read_version_bytes
+        result = self.read_version_bytes(name, version)
+        if "error" in result: return result
+        encoding = result["version"]["codificacion"]
+        if encoding is None: return {"error": "Versión binaria: use read_version_bytes."}
+        try:
+            content = result["datos"].decode(encoding)
+        except UnicodeDecodeError:
+            return {"error": "Archivo dañado: el contenido no se puede decodificar."}
+        return {"entry": result["entry"], "version": result["version"], "content": content}
+
+    def restore_version(self, name: str, version: int) -> str:
+        # Restaurar es una modificación más: la versión actual queda guardada y se puede deshacer
+        name = normalize_path(name) or name
+        result = self.read_version_bytes(name, version)
+        if "error" in result: return f"Error: {result['error']}"
+        if result["version"]["actual"]: return f"Error: La versión {version} es la actual."
+        message = self.modify_file_bytes(name, bytes(result["datos"]), result["version"]["codificacion"])
+        if not message.startswith("Éxito"): return message
+        return f"Éxito: Archivo '{name}' restaurado a la versión {version}."
+
+    @synchronized
     def delete_file(self, name: str) -> str:
+        name = normalize_path(name) or name
         if name not in self.fat["files"]: return "Error: Archivo no existe."
         entry = self.fat["files"][name]
         if entry["papelera"]: return "Error: Ya está en papelera."
@@ -258,12 +1543,18 @@ class FileSystemController:
         if not self.is_admin() and entry["owner"] != self.current_user: return "Error: Solo el owner o admin puede eliminar."
         
         now = datetime.datetime.now().isoformat()
+        self._account(entry, -1)
         entry["papelera"] = True
         entry["fecha_eliminacion"] = now
-        self.save_all()
+        self._account(entry, 1)
+        self.mark_dirty(files=[name])
+        self._write_back()
+        self.get_index_worker().submit("remove", name)
         return f"Éxito: Archivo '{name}' movido a papelera."
 
+    @synchronized
     def recover_file(self, name: str) -> str:
+        name = normalize_path(name) or name
         if name not in self.fat["files"]: return "Error: Archivo no existe."
         entry = self.fat["files"][name]
         if not entry["papelera"]: return "Error: No está en papelera."
@@ -271,12 +1562,18 @@ class FileSystemController:
         # VALIDACIÓN DE OWNER / ADMIN para recuperar
         if not self.is_admin() and entry["owner"] != self.current_user: return "Error: Solo el owner o admin puede recuperar."
         
+        self._account(entry, -1)
         entry["papelera"] = False
         entry["fecha_eliminacion"] = None
-        self.save_all()
+        self._account(entry, 1)
+        self.mark_dirty(files=[name])
+        self._write_back()
+        self.get_index_worker().submit("add", name, self._content_loader(name))
         return f"Éxito: Archivo '{name}' recuperado."
     
+    @synchronized
     def manage_permissions(self, name: str, target_user: str, perm_type: str, add: bool) -> str:
+        name = normalize_path(name) or name
         if name not in self.fat["files"]: return "Error: Archivo no existe."
         entry = self.fat["files"][name]
         
@@ -287,7 +1584,8 @@ class FileSystemController:
         if target_user not in self.users: return "Error: Usuario objetivo no existe."
         if perm_type not in ["lectura", "escritura"]: return "Error: Tipo de permiso inválido."
 
-        perms = entry.setdefault("permissions", {})
+        # Se arma una copia y se asigna completa: las entradas compactas no exponen su dict interno
+        perms = {user: list(values) for user, values in entry.get("permissions", {}).items()}
         user_perms = perms.setdefault(target_user, [])
         
         if add:
@@ -303,5 +1601,7 @@ class FileSystemController:
             else:
                 message = f"Permiso {perm_type} no existía para {target_user}."
 
-        self.save_all()
+        entry["permissions"] = perms
+        self.mark_dirty(files=[name])
+        self._write_back()
         return f"Éxito: {message}"
\ No newline at end of file
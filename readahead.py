@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Optional, Set
+
+def warm_blocks(block_paths: List[str]):
+    # Pide al kernel que traiga los bloques a la caché de páginas (lectura asíncrona, sin
+    # copiar nada a Python); donde no hay posix_fadvise se leen y se descartan
+    for block_path in block_paths:
+        try:
+            if hasattr(os, "posix_fadvise"):
+                fd = os.open(block_path, os.O_RDONLY)
+                try:
+                    os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+                finally:
+                    os.close(fd)
+            else:
+                with open(block_path, 'rb') as f:
+                    f.read()
+        except OSError:
+            pass
+
+def physical_successor(block_path: str, distance: int = 1) -> Optional[str]:
+    # block_<nombre>_<n>.blk -> block_<nombre>_<n + distance>.blk: create_blocks y el
+    # desfragmentador dejan las cadenas con índices consecutivos
+    stem, ext = os.path.splitext(block_path)
+    base, sep, index = stem.rpartition("_")
+    if not sep or not index.isdigit():
+        return None
+    return f"{base}_{int(index) + distance}{ext}"
+
+class ReadAhead:
+    """Lectura anticipada de cadenas de bloques en un pool de hilos.
+
+    Cada recorrido de una cadena abre un ``ChainPrefetch`` con ``stream()`` y le avisa
+    cada bloque antes de leerlo. Cuando el lector sigue dos enlaces que coinciden con
+    el sucesor físico del bloque, el pool calienta en la caché de páginas los
+    siguientes bloques de la ventana mientras el lector procesa el actual; el lector
+    sigue leyendo con su propio ``readinto``. La ventana se duplica con cada acierto
+    (hasta ``max_window``) y se reduce a la mitad con cada fallo.
+
+    Solo conviene cuando las lecturas en frío tardan más que pedirlas por adelantado
+    (disco lento o de red); con la caché caliente agrega trabajo. Ver
+    ``python benchmarks.py readahead``.
+    """
+
+    def __init__(self, workers: int = 1, min_window: int = 4, max_window: int = 32):
+        self.workers = workers
+        self.min_window = min_window
+        self.max_window = max_window
+        self.stats: Dict[str, int] = {"aciertos": 0, "fallos": 0, "anticipados": 0}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def submit(self, block_paths: List[str]) -> Future:
+        # El pool se crea al primer uso: los recorridos de un solo bloque no lanzan hilos
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="readahead")
+            self.stats["anticipados"] += len(block_paths)
+            return self._pool.submit(warm_blocks, block_paths)
+
+    def stream(self, total_blocks: Optional[int] = None) -> "ChainPrefetch":
+        # total_blocks (si se conoce, p. ej. por la FAT) evita pedir bloques más allá del final
+        return ChainPrefetch(self, total_blocks)
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True, cancel_futures=True)
+                self._pool = None
+
+class ChainPrefetch:
+    """Un recorrido de una cadena; ``advance()`` se llama con cada bloque antes de leerlo."""
+
+    def __init__(self, engine: ReadAhead, total_blocks: Optional[int] = None):
+        self.engine = engine
+        self.total_blocks = total_blocks
+        self.window = engine.min_window
+        # Bloques pedidos y todavía no alcanzados por el lector: a lo sumo "window"
+        self._hinted: Set[str] = set()
+        self._futures: List[Future] = []
+        self._frontier: Optional[str] = None
+        self._last: Optional[str] = None
+        self._consumed = 0
+
+    def advance(self, block_path: str):
+        self._consumed += 1
+        if block_path in self._hinted:
+            self._hinted.discard(block_path)
+            self.engine.stats["aciertos"] += 1
+            self.window = min(self.window * 2, self.engine.max_window)
+        elif self._hinted:
+            # La cadena no siguió la predicción: se descarta lo pedido y se achica la ventana
+            self.engine.stats["fallos"] += 1
+            self._cancel()
+            self.window = max(self.window // 2, self.engine.min_window)
+
+        sequential = self._last is not None and physical_successor(self._last) == block_path
+        self._last = block_path
+        if sequential:
+            self._schedule(block_path)
+
+    def _schedule(self, block_path: str):
+        window = self.window
+        if self.total_blocks is not None:
+            window = min(window, self.total_blocks - self._consumed)
+        missing = window - len(self._hinted)
+        # Se pide de a tramos para que cada tarea del pool valga el traspaso entre hilos
+        if missing <= 0 or (self._hinted and missing < self.engine.min_window):
+            return
+        start = self._frontier if self._hinted else block_path
+        targets = []
+        for distance in range(1, missing + 1):
+            target = physical_successor(start, distance)
+            if target is None:
+                return
+            targets.append(target)
+        self._frontier = targets[-1]
+        self._hinted.update(targets)
+        self._futures = [future for future in self._futures if not future.done()]
+        self._futures.append(self.engine.submit(targets))
+
+    def _cancel(self):
+        for future in self._futures:
+            future.cancel()
+        self._futures.clear()
+        self._hinted.clear()
+
+    def close(self):
+        # El lector terminó (o abandonó la cadena): lo que no empezó a pedirse se cancela
+        self._cancel()
+
+    def __enter__(self) -> "ChainPrefetch":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,341 @@
+"""Replicación asíncrona del volumen a un directorio espejo.
+
+Uso:
+    FAT_MIRROR=ESPEJO python main_app.py        (o python -m fat_cli ...)
+    python replication.py sincronizar ESPEJO    # puesta al día completa, sin sesión abierta
+    python replication.py estado ESPEJO         # lag y contadores del último replicador
+    python replication.py promover ESPEJO       # deja el espejo listo para usarse como primario
+
+ESPEJO/filesystem/ es la copia de filesystem/ (las rutas del volumen son relativas, así
+que el espejo se usa ejecutando la aplicación desde ESPEJO). El índice de búsqueda no se
+replica: es derivado y se reconstruye en el espejo al primer uso.
+"""
+import argparse
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional, Set, Tuple
+
+from main_logic import (DIRS_FILE, FAT_BIN_FILE, FAT_FILE, FAT_SHARDS_DIR, FS_DIR, SEARCH_INDEX_DIR, SESSIONS_FILE,
+                        USAGE_FILE, USERS_FILE, FileSystemController, add_change_listener, remove_change_listener)
+
+MAX_QUEUE = 65536
+BATCH_SIZE = 256
+BATCH_DELAY = 0.05            # espera para juntar cambios en un mismo lote (s)
+BACKPRESSURE_TIMEOUT = 5.0    # con la cola llena el escritor espera esto; después el espejo queda para resync
+RETRY_DELAY = 1.0
+STATUS_INTERVAL = 1.0
+STATUS_FILE = "replicacion.json"
+# Dentro de un lote los metadatos se copian después de los bloques, así la FAT del espejo
+# no apunta a bloques que todavía no llegaron; los borrados van al final
+METADATA_PATHS = (FAT_FILE, FAT_BIN_FILE, FAT_SHARDS_DIR, DIRS_FILE, USERS_FILE, USAGE_FILE, SESSIONS_FILE)
+
+def _under(path: str, roots: Iterable[str]) -> bool:
+    return any(path == root or path.startswith(root + os.sep) for root in roots)
+
+def _replicated(path: str) -> bool:
+    return _under(path, (FS_DIR,)) and not path.endswith(".tmp") and not _under(path, (SEARCH_INDEX_DIR,))
+
+def _stamp(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_size, st.st_mtime_ns
+
+def _walk(root: str, base: str) -> Iterator[str]:
+    # Rutas relativas a base ("filesystem/...") de los archivos replicables bajo root
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.relpath(os.path.join(dirpath, filename), base)
+            if _replicated(path):
+                yield path
+
+def _metadata_stamps() -> Dict[str, Optional[Tuple[int, int]]]:
+    # Todo cambio del volumen termina reescribiendo algún metadato (FAT, shards, uso, ...)
+    stamps = {}
+    for path in METADATA_PATHS:
+        if os.path.isdir(path):
+            stamps.update((sub_path, _stamp(sub_path)) for sub_path in _walk(path, "."))
+        else:
+            stamps[path] = _stamp(path)
+    return stamps
+
+def _as_json(stamps: Dict) -> Dict:
+    # Igual a como vuelve de replicacion.json, para comparar
+    return {path: list(stamp) if stamp is not None else None for path, stamp in stamps.items()}
+
+def _read_status(mirror_root: str) -> Dict:
+    try:
+        with open(os.path.join(mirror_root, STATUS_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_status(mirror_root: str, status: Dict):
+    path = os.path.join(mirror_root, STATUS_FILE)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(status, f, indent=4)
+    os.replace(tmp_path, path)
+
+class Replicator:
+    """Envía al espejo cada ruta del volumen que el controlador escribe o borra.
+
+    Los cambios pasan por una cola acotada y un hilo los aplica en lotes: cada ruta se
+    copia tal como está en el primario en ese momento (o se borra si ya no existe), así
+    aplicar dos veces o fuera de lote es inofensivo. Si la cola se llena más de
+    ``BACKPRESSURE_TIMEOUT`` o falla una copia, el espejo se pone al día con ``resync``.
+
+    Al detenerse sin nada pendiente el estado del espejo registra los stamps de los metadatos
+    del primario: si al arrancar siguen iguales, nadie escribió sin replicar y se evita el
+    resync inicial (que recorre todo el volumen, y en fat_cli se pagaría en cada comando).
+    """
+
+    def __init__(self, mirror_root: str, max_queue: int = MAX_QUEUE):
+        self.mirror_root = mirror_root
+        self._queue: "queue.Queue[Optional[Tuple[str, float]]]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._inflight_since: Optional[float] = None
+        self._needs_resync = True   # al arrancar: el espejo pudo quedar atrás mientras no había replicador
+        self._last_status = 0.0
+        self._dirs: Set[str] = set()
+        self.enqueued = 0
+        self.applied = 0
+        self.batches = 0
+        self.bytes_copied = 0
+        self.files_deleted = 0
+        self.dropped = 0
+        self.resyncs = 0
+        self.backpressure_seconds = 0.0
+        self.max_lag = 0.0
+        self.applied_until: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        status = _read_status(self.mirror_root)
+        if status.get("cierre_limpio") and status.get("metadatos_primario") == _as_json(_metadata_stamps()):
+            self._needs_resync = False
+        add_change_listener(self._on_change)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        # Termina de aplicar lo encolado (y el resync pendiente, si lo hay) antes de volver
+        remove_change_listener(self._on_change)
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def wait(self):
+        self._queue.join()
+
+    def _on_change(self, path: str):
+        if not _replicated(path):
+            return
+        if self._needs_resync:
+            # El resync pendiente ya cubre este cambio: no se espera a que la cola tenga lugar
+            try:
+                self._queue.put_nowait((path, time.time()))
+                self.enqueued += 1
+            except queue.Full:
+                self.dropped += 1
+            return
+        start = time.perf_counter()
+        try:
+            self._queue.put((path, time.time()), timeout=BACKPRESSURE_TIMEOUT)
+            self.enqueued += 1
+        except queue.Full:
+            # El espejo no da abasto: se deja de esperar y se lo pone al día completo después
+            self._needs_resync = True
+            self.dropped += 1
+        self.backpressure_seconds += time.perf_counter() - start
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            if self._needs_resync and self._queue.empty():
+                self._safe(self.resync)
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            batch = {item[0]}
+            self._inflight_since = oldest = newest = item[1]
+            taken = 1
+            deadline = time.monotonic() + BATCH_DELAY
+            while len(batch) < BATCH_SIZE:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                taken += 1
+                if item is None:
+                    stopping = True
+                    break
+                batch.add(item[0])
+                newest = item[1]
+            if self._safe(lambda: self._apply(batch)):
+                self.applied += len(batch)
+                self.batches += 1
+                self.applied_until = newest
+            self.max_lag = max(self.max_lag, time.time() - oldest)
+            self._inflight_since = None
+            for _ in range(taken):
+                self._queue.task_done()
+            self._maybe_write_status()
+        if self._needs_resync:
+            self._safe(self.resync)
+        self._write_final_status()
+
+    def _safe(self, action) -> bool:
+        try:
+            action()
+            return True
+        except OSError as e:
+            # Espejo inaccesible o lleno: se reintenta con una puesta al día completa
+            self.last_error = str(e)
+            self._needs_resync = True
+            self._dirs.clear()
+            time.sleep(RETRY_DELAY)
+            return False
+
+    def _apply(self, paths: Set[str]) -> Tuple[int, int]:
+        present = {path for path in paths if os.path.exists(path)}
+        gone = paths - present
+        ordered = sorted(present, key=lambda path: _under(path, METADATA_PATHS))
+        copied = deleted = 0
+        for path in ordered:
+            if self._copy(path):
+                copied += 1
+        for path in sorted(gone, key=lambda path: _under(path, METADATA_PATHS)):
+            target = os.path.join(self.mirror_root, path)
+            if os.path.exists(target):
+                os.remove(target)
+                self.files_deleted += 1
+                deleted += 1
+        return copied, deleted
+
+    def _copy(self, path: str) -> bool:
+        # Temporal + os.replace también en el espejo: una promoción nunca ve un archivo a medias
+        target = os.path.join(self.mirror_root, path)
+        directory = os.path.dirname(target)
+        if directory not in self._dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._dirs.add(directory)
+        tmp_path = f"{target}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            # El stat va antes de copiar: si el archivo cambia en el medio, el espejo queda con un
+            # mtime anterior y el próximo resync lo vuelve a copiar
+            st = os.stat(path)
+            shutil.copyfile(path, tmp_path)
+        except FileNotFoundError as e:
+            if e.filename != path:
+                raise
+            # Se borró en el primario mientras tanto: su propio aviso llega en otro lote
+            return False
+        # Solo el mtime (no permisos ni xattrs como copy2): es lo que compara resync
+        os.utime(tmp_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp_path, target)
+        self.bytes_copied += st.st_size
+        return True
+
+    def resync(self) -> Dict[str, int]:
+        # Puesta al día completa: copia lo que difiere en tamaño o mtime y borra del espejo lo
+        # que ya no existe. Los cambios que ocurran mientras tanto llegan por la cola
+        self._needs_resync = False
+        primary = {path: _stamp(path) for path in _walk(FS_DIR, ".")}
+        mirror = {path: _stamp(os.path.join(self.mirror_root, path))
+                  for path in _walk(os.path.join(self.mirror_root, FS_DIR), self.mirror_root)}
+        changed = {path for path, stamp in primary.items() if mirror.get(path) != stamp}
+        removed = {path for path in mirror if path not in primary}
+        copied, deleted = self._apply(changed | removed)
+        self.resyncs += 1
+        return {"copiados": copied, "borrados": deleted}
+
+    def lag(self) -> float:
+        # Antigüedad del cambio más viejo que todavía no está en el espejo
+        with self._queue.mutex:
+            head = self._queue.queue[0] if self._queue.queue else None
+        pending = [head[1]] if head is not None else []
+        if self._inflight_since is not None:
+            pending.append(self._inflight_since)
+        return time.time() - min(pending) if pending else 0.0
+
+    def stats(self) -> Dict:
+        return {"espejo": self.mirror_root, "en_cola": self._queue.qsize(), "lag_s": self.lag(),
+                "lag_max_s": self.max_lag, "aplicado_hasta": self.applied_until, "encolados": self.enqueued,
+                "aplicados": self.applied, "lotes": self.batches, "bytes_copiados": self.bytes_copied,
+                "borrados": self.files_deleted, "descartados": self.dropped, "resyncs": self.resyncs,
+                "resync_pendiente": self._needs_resync, "espera_backpressure_s": self.backpressure_seconds,
+                "ultimo_error": self.last_error}
+
+    def _write_final_status(self):
+        status = dict(self.stats(), actualizado=time.time(), cierre_limpio=not self._needs_resync)
+        if not self._needs_resync:
+            status["metadatos_primario"] = _as_json(_metadata_stamps())
+        try:
+            _write_status(self.mirror_root, status)
+        except OSError:
+            pass
+
+    def _maybe_write_status(self):
+        now = time.time()
+        if now - self._last_status >= STATUS_INTERVAL:
+            self._last_status = now
+            try:
+                _write_status(self.mirror_root, dict(self.stats(), actualizado=now))
+            except OSError:
+                pass
+
+def start_mirror(mirror_root: str) -> Replicator:
+    replicator = Replicator(mirror_root)
+    replicator.start()
+    return replicator
+
+def _walk_tmp(root: str) -> Iterator[str]:
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.endswith(".tmp"):
+                yield os.path.join(dirpath, filename)
+
+def promote(mirror_root: str) -> Dict:
+    # Con el primario detenido: se descartan las copias interrumpidas y fsck repara lo que un
+    # lote a medias pudo dejar (bloques sin su FAT o al revés). Deja el proceso en mirror_root
+    from fsck import fsck
+
+    os.chdir(mirror_root)
+    for path in list(_walk_tmp(FS_DIR)):
+        os.remove(path)
+    controller = FileSystemController()
+    report = fsck(controller, repair=True)
+    controller.shutdown()
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Replicación del volumen a un directorio espejo")
+    parser.add_argument("accion", choices=["sincronizar", "estado", "promover"])
+    parser.add_argument("espejo")
+    args = parser.parse_args()
+
+    if args.accion == "sincronizar":
+        replicator = Replicator(args.espejo)
+        result = replicator.resync()
+        replicator._write_final_status()
+        print(f"Espejo al día: {result['copiados']} archivos copiados, {result['borrados']} borrados")
+    elif args.accion == "estado":
+        status = _read_status(args.espejo)
+        for key, value in status.items():
+            if key != "metadatos_primario":
+                print(f"{key}: {value}")
+    else:
+        report = promote(args.espejo)
+        print(f"Espejo promovido: {report['archivos_revisados']} archivos, "
+              f"{report['total_problemas']} problemas reparados")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+import os
+import queue
+import re
+import threading
+import zlib
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+SEGMENTS = 64
+TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> Iterator[Tuple[str, int, int]]:
+    # (token, posición ordinal, offset en caracteres)
+    for position, match in enumerate(TOKEN_RE.finditer(text)):
+        yield match.group().lower(), position, match.start()
+
+def _segment_of(key: str) -> int:
+    return zlib.crc32(key.encode("utf-8")) % SEGMENTS
+
+def _stamp(path: str) -> Optional[Tuple[int, int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def _encode_postings(postings: List[List[int]]) -> List[int]:
+    # [[pos, offset], ...] ordenados -> deltas aplanados [dpos, doffset, ...]
+    flat = []
+    prev_pos = prev_offset = 0
+    for pos, offset in postings:
+        flat += [pos - prev_pos, offset - prev_offset]
+        prev_pos, prev_offset = pos, offset
+    return flat
+
+def _decode_postings(flat: List[int]) -> List[List[int]]:
+    postings = []
+    pos = offset = 0
+    for i in range(0, len(flat), 2):
+        pos += flat[i]
+        offset += flat[i + 1]
+        postings.append([pos, offset])
+    return postings
+
+class SearchIndex:
+    """Índice invertido token -> {archivo: [[posición, offset], ...]}.
+
+    Se guarda en ``SEGMENTS`` segmentos por hash del token (``terms_XX.json``) más
+    un índice directo archivo -> tokens (``docs_XX.json``) para poder quitar un
+    archivo sin releer su contenido. Los segmentos se cargan al primer uso y solo
+    se reescriben los que cambiaron.
+
+    Varios procesos comparten el índice: un segmento cargado que cambió en disco
+    (mtime/tamaño/inodo) se recarga antes de buscar, y antes de escribirlo se le
+    vuelven a aplicar solo las entradas que cambió esta sesión.
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self._terms: Dict[int, Dict[str, Dict[str, List]]] = {}
+        self._docs: Dict[int, Dict[str, List[str]]] = {}
+        self._stamps: Dict[Tuple[str, int], Optional[Tuple[int, int, int]]] = {}
+        # (kind, segment) -> claves propias sin guardar: (token, archivo) en terms, archivo en docs.
+        # None: el segmento se reescribe entero (clear)
+        self._dirty: Dict[Tuple[str, int], Optional[Set]] = {}
+        self.lock = threading.RLock()
+
+    def _path(self, kind: str, segment: int) -> str:
+        return os.path.join(self.index_dir, f"{kind}_{segment:02d}.json")
+
+    def _load(self, kind: str, segment: int) -> Dict:
+        cache = self._terms if kind == "terms" else self._docs
+        data = cache.get(segment)
+        if data is None:
+            path = self._path(kind, segment)
+            # El stamp va antes de leer: si cambia en el medio, la próxima revisión lo recarga
+            self._stamps[(kind, segment)] = _stamp(path)
+            data = {}
+            if os.path.exists(path):
+                with open(path, 'r') as f:
+                    data = json.load(f)
+                if kind == "terms":
+                    data = {token: {name: _decode_postings(flat) for name, flat in files.items()}
+                            for token, files in data.items()}
+            cache[segment] = data
+        return data
+
+    def _current(self, kind: str, segment: int) -> Dict:
+        # Como _load, pero recargando el segmento si otro proceso lo reescribió
+        cache = self._terms if kind == "terms" else self._docs
+        if (segment in cache and self._dirty.get((kind, segment), ()) is not None
+                and _stamp(self._path(kind, segment)) != self._stamps.get((kind, segment))):
+            self._merge(kind, segment)
+        return self._load(kind, segment)
+
+    def _merge(self, kind: str, segment: int):
+        # Recarga el segmento de disco y vuelve a aplicar las entradas propias sin guardar
+        cache = self._terms if kind == "terms" else self._docs
+        mine = cache.pop(segment)
+        data = self._load(kind, segment)
+        for key in self._dirty.get((kind, segment), ()):
+            if kind == "docs":
+                if key in mine:
+                    data[key] = mine[key]
+                else:
+                    data.pop(key, None)
+                continue
+            token, name = key
+            postings = mine.get(token, {}).get(name)
+            if postings is not None:
+                data.setdefault(token, {})[name] = postings
+            elif token in data:
+                data[token].pop(name, None)
+                if not data[token]:
+                    del data[token]
+
+    def _mark(self, kind: str, segment: int, key):
+        keys = self._dirty.setdefault((kind, segment), set())
+        if keys is not None:
+            keys.add(key)
+
+    def remove_file(self, name: str):
+        with self.lock:
+            docs = self._current("docs", _segment_of(name))
+            tokens = docs.pop(name, None)
+            if tokens is None:
+                return
+            self._mark("docs", _segment_of(name), name)
+            for token in tokens:
+                segment = _segment_of(token)
+                files = self._current("terms", segment).get(token)
+                if files and files.pop(name, None) is not None:
+                    if not files:
+                        del self._load("terms", segment)[token]
+                    self._mark("terms", segment, (token, name))
+
+    def add_file(self, name: str, content: str):
+        postings: Dict[str, List[List[int]]] = {}
+        for token, position, offset in tokenize(content):
+            postings.setdefault(token, []).append([position, offset])
+        with self.lock:
+            self.remove_file(name)
+            for token, token_postings in postings.items():
+                segment = _segment_of(token)
+                self._load("terms", segment).setdefault(token, {})[name] = token_postings
+                self._mark("terms", segment, (token, name))
+            self._load("docs", _segment_of(name))[name] = sorted(postings)
+            self._mark("docs", _segment_of(name), name)
+
+    def search(self, query: str) -> Dict[str, List[int]]:
+        # Frase: todos los tokens en posiciones consecutivas. Devuelve archivo -> offsets
+        tokens = [token for token, _, _ in tokenize(query)]
+        if not tokens:
+            return {}
+        with self.lock:
+            per_token = [self._current("terms", _segment_of(token)).get(token, {}) for token in tokens]
+            candidates = set(per_token[0])
+            for files in per_token[1:]:
+                candidates &= set(files)
+            results = {}
+            for name in candidates:
+                following = [{pos for pos, _ in files[name]} for files in per_token[1:]]
+                offsets = [offset for pos, offset in per_token[0][name]
+                           if all(pos + i + 1 in positions for i, positions in enumerate(following))]
+                if offsets:
+                    results[name] = offsets
+        return results
+
+    def save(self):
+        with self.lock:
+            if not self._dirty:
+                return
+            os.makedirs(self.index_dir, exist_ok=True)
+            for kind, segment in sorted(self._dirty):
+                # Sin esto se pisarían las entradas que otro proceso guardó desde nuestra carga
+                data = self._current(kind, segment)
+                if kind == "terms":
+                    data = {token: {name: _encode_postings(postings) for name, postings in files.items()}
+                            for token, files in data.items()}
+                path = self._path(kind, segment)
+                # Temporal propio por proceso/hilo: varias sesiones guardan el mismo segmento
+                tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w') as f:
+                    json.dump(data, f, separators=(",", ":"))
+                os.replace(tmp_path, path)
+                self._stamps[(kind, segment)] = _stamp(path)
+            self._dirty.clear()
+
+    def clear(self):
+        with self.lock:
+            self._terms = {segment: {} for segment in range(SEGMENTS)}
+            self._docs = {segment: {} for segment in range(SEGMENTS)}
+            self._dirty = {(kind, segment): None for kind in ("terms", "docs") for segment in range(SEGMENTS)}
+
+class IndexWorker:
+    """Aplica las actualizaciones del índice en un hilo aparte para no frenar las escrituras."""
+
+    def __init__(self, index: SearchIndex):
+        self.index = index
+        self.tasks: queue.Queue = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, op: str, name: str, content=None):
+        # content puede ser un str o una función sin argumentos que lo lee (se evalúa en el hilo)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        self.tasks.put((op, name, content))
+
+    def _run(self):
+        while True:
+            op, name, content = self.tasks.get()
+            try:
+                if callable(content):
+                    try:
+                        content = content()
+                    except Exception:
+                        content = None
+                if op == "add" and content is not None:
+                    self.index.add_file(name, content)
+                else:
+                    self.index.remove_file(name)
+                # Se persiste cuando la cola se vacía, agrupando ráfagas de escrituras
+                if self.tasks.empty():
+                    self.index.save()
+            finally:
+                self.tasks.task_done()
+
+    def wait(self):
+        self.tasks.join()
@@ -146,6 +146,12 @@ class MainWindow(QWidget):
         self.modify_content_input = QTextEdit()
         self.btn_load_content = QPushButton()
         self.btn_modify = QPushButton()
+        self.version_list = QListWidget()
+        self.version_list.setObjectName('version_list')
+        self.version_retention_input = QLineEdit()
+        self.btn_set_retention = QPushButton()
+        self.btn_view_version = QPushButton()
+        self.btn_restore_version = QPushButton()
         
         self.delete_name_input = QLineEdit()
         self.delete_name_input.setObjectName('delete_name_input')
@@ -161,6 +167,13 @@ class MainWindow(QWidget):
         self.add_pass_input = QLineEdit()
         self.add_role_combo = QComboBox()
         self.btn_add_user = QPushButton()
+        self.usage_list = QListWidget()
+        self.usage_list.setObjectName('usage_list')
+        self.quota_user_input = QLineEdit()
+        self.quota_value_input = QLineEdit()
+        self.btn_set_quota = QPushButton()
+        self.capacity_value_input = QLineEdit()
+        self.btn_set_capacity = QPushButton()
         
         self.perm_file_input = QLineEdit()
         self.perm_file_input.setObjectName('perm_file_input')
@@ -169,6 +182,11 @@ class MainWindow(QWidget):
         self.perm_action_combo = QComboBox()
         self.btn_apply_perm = QPushButton()
 
+        self.search_input = QLineEdit()
+        self.search_input.setObjectName('search_input')
+        self.search_results = QListWidget()
+        self.btn_search = QPushButton()
+
         self.main_layout = QHBoxLayout(self)
         self.main_layout.setContentsMargins(10, 10, 10, 10)
         self.main_layout.setSpacing(10)
@@ -209,6 +227,7 @@ class MainWindow(QWidget):
         self._add_menu_button("Listar Archivos 📄", self.show_list_files, self.file_ops_layout)
         self._add_menu_button("Abrir Archivo 📂", self.show_open_file, self.file_ops_layout)
         self.modify_btn = self._add_menu_button("Modificar Archivo ✏️", self.show_modify_file, self.file_ops_layout)
+        self._add_menu_button("Buscar en Contenido 🔍", self.show_search, self.file_ops_layout)
         
         self.btn_trash_ops = self._create_menu_block("Papelera")
         menu_layout.addWidget(self.btn_trash_ops)
@@ -322,7 +341,6 @@ class MainWindow(QWidget):
         list_widget = QListWidget()
         list_widget.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
         
-        self.controller.fat = self.controller.load_fat()
         files = self.controller.get_list_files(is_trash=is_trash)
         
         header = f"{'Nombre':<20} | {'Owner':<15} | {'Tamaño (chars)' if not is_trash else 'Fecha Eliminación':<15} | {'Fecha Modificación' if not is_trash else ''}"
@@ -392,6 +410,29 @@ class MainWindow(QWidget):
         self.btn_modify.setText("Guardar Modificación")
         self.btn_modify.setStyleSheet(f"background-color: #f39c12; color: {COLOR_TEXT}; padding: 10px;")
         layout.addWidget(self.btn_modify)
+
+        history_block = ContentBlock("Historial de Versiones")
+        self.version_list.clear()
+        self.version_list.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT}; min-height: 100px;")
+        history_block.content_layout.addWidget(self.version_list)
+
+        history_frame = QFrame()
+        history_frame.setStyleSheet("background-color: transparent; border: none;")
+        history_layout = QHBoxLayout(history_frame)
+        history_layout.addWidget(QLabel("Versiones a conservar (0 = sin versionado):"))
+        self.version_retention_input.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
+        history_layout.addWidget(self.version_retention_input)
+        self.btn_set_retention.setText("Aplicar")
+        self.btn_set_retention.setStyleSheet(f"background-color: #34495e; color: {COLOR_TEXT}; padding: 5px;")
+        history_layout.addWidget(self.btn_set_retention)
+        self.btn_view_version.setText("Ver Versión")
+        self.btn_view_version.setStyleSheet(f"background-color: #7f8c8d; color: {COLOR_TEXT}; padding: 5px;")
+        history_layout.addWidget(self.btn_view_version)
+        self.btn_restore_version.setText("Restaurar Versión")
+        self.btn_restore_version.setStyleSheet(f"background-color: #27ae60; color: {COLOR_TEXT}; padding: 5px;")
+        history_layout.addWidget(self.btn_restore_version)
+        history_block.content_layout.addWidget(history_frame)
+        layout.addWidget(history_block)
         
         self._switch_content_page("5. Modificar Archivo", page)
         
@@ -460,6 +501,36 @@ class MainWindow(QWidget):
         
         add_block.content_layout.addWidget(add_frame)
         layout.addWidget(add_block)
+
+        usage_block = ContentBlock("Uso de Espacio y Cuotas")
+        self.usage_list.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT}; min-height: 100px;")
+        usage_block.content_layout.addWidget(self.usage_list)
+
+        quota_frame = QFrame()
+        quota_frame.setStyleSheet("background-color: transparent; border: none;")
+        quota_layout = QHBoxLayout(quota_frame)
+        quota_layout.addWidget(QLabel("Usuario:"))
+        self.quota_user_input.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
+        quota_layout.addWidget(self.quota_user_input)
+        quota_layout.addWidget(QLabel("Cuota (caracteres, vacío = sin límite):"))
+        self.quota_value_input.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
+        quota_layout.addWidget(self.quota_value_input)
+        self.btn_set_quota.setText("Asignar Cuota")
+        self.btn_set_quota.setStyleSheet(f"background-color: #34495e; color: {COLOR_TEXT}; padding: 10px;")
+        quota_layout.addWidget(self.btn_set_quota)
+        usage_block.content_layout.addWidget(quota_frame)
+
+        capacity_frame = QFrame()
+        capacity_frame.setStyleSheet("background-color: transparent; border: none;")
+        capacity_layout = QHBoxLayout(capacity_frame)
+        capacity_layout.addWidget(QLabel("Capacidad del volumen (bloques, vacío = sin límite):"))
+        self.capacity_value_input.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
+        capacity_layout.addWidget(self.capacity_value_input)
+        self.btn_set_capacity.setText("Asignar Capacidad")
+        self.btn_set_capacity.setStyleSheet(f"background-color: #34495e; color: {COLOR_TEXT}; padding: 10px;")
+        capacity_layout.addWidget(self.btn_set_capacity)
+        usage_block.content_layout.addWidget(capacity_frame)
+        layout.addWidget(usage_block)
         
         self._switch_content_page("8. Gestión de Usuarios (Admin)", page)
 
@@ -493,4 +564,24 @@ class MainWindow(QWidget):
         self.btn_apply_perm.setStyleSheet(f"background-color: #9b59b6; color: {COLOR_TEXT}; padding: 10px;")
         layout.addWidget(self.btn_apply_perm)
 
-        self._switch_content_page("9. Gestión de Permisos (Owner)", page)
\ No newline at end of file
+        self._switch_content_page("9. Gestión de Permisos (Owner)", page)
+
+    def show_search(self):
+        page = QWidget()
+        layout = QVBoxLayout(page)
+
+        h_layout = QHBoxLayout()
+        h_layout.addWidget(QLabel("Frase a buscar:"))
+        self.search_input.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT};")
+        h_layout.addWidget(self.search_input)
+
+        self.btn_search.setText("Buscar")
+        self.btn_search.setStyleSheet(f"background-color: #2980b9; color: {COLOR_TEXT}; padding: 5px;")
+        h_layout.addWidget(self.btn_search)
+        layout.addLayout(h_layout)
+
+        self.search_results.clear()
+        self.search_results.setStyleSheet(f"background-color: {COLOR_HIGHLIGHT}; color: {COLOR_TEXT}; min-height: 200px;")
+        layout.addWidget(self.search_results)
+
+        self._switch_content_page("10. Buscar en Contenido", page)